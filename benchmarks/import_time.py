@@ -0,0 +1,109 @@
+"""Tempo de importação do app, medido com python -X importtime em um processo novo a cada rodada.
+
+Importar fast_zero.app não deve abrir conexões, ler o .env mais de uma vez nem subir processos: isso tudo fica no lifespan.
+O resultado sai em JSON (total em ms e os módulos mais caros), para comparar entre commits.
+
+Uso: python -m benchmarks.import_time --runs 5 --output import.json
+     python -m benchmarks.import_time --baseline import.json --tolerance 0.2 --budget-ms 1500
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH_ENV = {
+    'DATABASE_URL': 'sqlite:///import-time.db',
+    'SECRET_KEY': 'import-time-secret-key-with-32-bytes!!',
+    'ALGORITHM': 'HS256',
+    'ACCESS_TOKEN_EXPIRE_MINUTES': '30',
+}
+# Só o mínimo para o Settings validar; o banco nunca é aberto na importação.
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    # Linhas "import time:  self [us] | cumulative | imported package"; o nome vem indentado pela profundidade.
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, total, name = line.removeprefix('import time:').split('|')
+        cumulative[name.strip()] = int(total)
+    return cumulative
+
+
+def measure(module: str) -> dict[str, int]:
+    # -X importtime escreve no stderr; um processo novo por rodada para não contar com os módulos já em cache.
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        env={**os.environ, **BENCH_ENV},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def run(args) -> dict:
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda cumulative: cumulative[args.module])
+    # A rodada mais rápida: as outras só somam ruído (cache de disco, outros processos).
+    top = sorted(best.items(), key=lambda item: item[1], reverse=True)[: args.top]
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'module': args.module,
+        'runs': args.runs,
+        'total_ms': round(best[args.module] / 1000, 1),
+        'modules_ms': {name: round(us / 1000, 1) for name, us in top},
+    }
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    if report['total_ms'] > baseline['total_ms'] * (1 + tolerance):
+        found.append(f'{report["module"]}: {baseline["total_ms"]}ms -> {report["total_ms"]}ms')
+    new = sorted(set(report['modules_ms']) - set(baseline['modules_ms']))
+    if new:
+        found.append('new modules among the slowest imports: ' + ', '.join(new))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='fast_zero.app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='quantos módulos mais caros listar')
+    parser.add_argument('--budget-ms', type=float, help='falha se o total passar desse valor')
+    parser.add_argument('--output', type=Path)
+    parser.add_argument('--baseline', type=Path, help='JSON de uma execução anterior para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + '\n', encoding='utf-8')
+
+    found = []
+    if args.budget_ms is not None and report['total_ms'] > args.budget_ms:
+        found.append(f'{args.module}: {report["total_ms"]}ms is over the {args.budget_ms}ms budget')
+    if args.baseline:
+        found += regressions(report, json.loads(args.baseline.read_text(encoding='utf-8')), args.tolerance)
+    if found:
+        sys.exit('import time regressions:\n' + '\n'.join(found))
+
+
+if __name__ == '__main__':
+    main()
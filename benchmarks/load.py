@@ -0,0 +1,331 @@
+"""Teste de carga dos endpoints principais: login, cadastro, listagem, atualização e remoção de usuários.
+
+Popula um SQLite em arquivo, sobe a aplicação (no mesmo processo via ASGI ou em um uvicorn local) e dispara cada
+cenário com concorrência fixa. O resultado sai em JSON (p50/p95/p99, req/s, status e pico de RSS), para comparar entre commits.
+
+Uso: python -m benchmarks.load --users 10000 --requests 1000 --concurrency 32 --output load.json
+     python -m benchmarks.load --server uvicorn --baseline load.json --tolerance 0.2 --max-error-ratio 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter
+
+import httpx
+from sqlalchemy import create_engine, insert
+
+PASSWORD = 'load-test-password'
+SCENARIOS = ['login', 'create', 'list', 'update', 'delete']
+PAGE_SIZE = 20
+
+BENCH_ENV = {
+    'SECRET_KEY': 'load-test-secret-key-with-at-least-32-bytes',
+    'ALGORITHM': 'HS256',
+    'ACCESS_TOKEN_EXPIRE_MINUTES': '60',
+    'LOGIN_RATE_ACCOUNT_CAPACITY': '1000000',
+    'LOGIN_RATE_ACCOUNT_PER_MINUTE': '1000000',
+    'LOGIN_RATE_IP_CAPACITY': '1000000',
+    'LOGIN_RATE_IP_PER_MINUTE': '1000000',
+    'CONCURRENCY_LIMITS_ENABLED': 'false',
+    'HASHING_QUEUE_DEPTH': '1000000',
+}
+# Sem rate limit, load shedding nem fila de hashing limitada: um 503 rápido não mede o endpoint.
+# Para medir o shedding de propósito, sobrescreva pelo ambiente (ex: CONCURRENCY_LIMITS_ENABLED=true) e use --max-error-ratio.
+# Valores padrão do ambiente do teste. Todas as requisições saem do mesmo IP, então sem isso o login só mediria o 429.
+# Variáveis já definidas no ambiente (ARGON2_*, HASHING_WORKERS, CONCURRENCY_*...) têm prioridade, exceto o DATABASE_URL.
+
+
+def seed(url: str, total: int, argon2_params: dict):
+    from fast_zero.hashing import build_password_hash  # noqa: PLC0415
+    from fast_zero.models import User, table_registry  # noqa: PLC0415
+
+    hashed = build_password_hash(**argon2_params).hash(PASSWORD)
+    # Um hash só para todos: o login verifica com o custo real do Argon2, mas o seed não leva minutos.
+    engine = create_engine(url)
+    table_registry.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for start in range(0, total, 50_000):
+            connection.execute(
+                insert(User),
+                [{'username': f'user{i}', 'email': f'user{i}@example.com', 'password': hashed} for i in range(start, min(start + 50_000, total))],
+            )
+    engine.dispose()
+    # Usuário i => id i + 1 (banco novo, sem sharding).
+
+
+def tokens_for(user_ids):
+    from fast_zero.security import create_access_token  # noqa: PLC0415
+
+    # Tokens gerados direto com a SECRET_KEY do teste: atualizar/remover não pode depender de um login (Argon2) por usuário.
+    return {user_id: create_access_token({'sub': f'user{user_id - 1}@example.com'}) for user_id in user_ids}
+
+
+def build_requests(users: int, requests: int, concurrency: int):
+    # Para cada cenário, uma função (worker, n) -> (método, caminho, kwargs) que monta a n-ésima requisição.
+    # Os últimos `requests` usuários são removidos no cenário delete; os primeiros `concurrency` são atualizados
+    # (cada worker atualiza sempre o mesmo usuário, então não existe disputa pela mesma linha).
+    victims = range(users - requests + 1, users + 1)
+    update_tokens = tokens_for(range(1, concurrency + 1))
+    delete_tokens = tokens_for(victims)
+    reader = update_tokens[1]
+
+    def login(worker, n):
+        return 'POST', '/auth/token', {'data': {'username': f'user{n % users}@example.com', 'password': PASSWORD}}
+
+    def create(worker, n):
+        return 'POST', '/users/', {'json': {'username': f'load{n}', 'email': f'load{n}@example.com', 'password': PASSWORD}}
+
+    def list_users(worker, n):
+        offset = (n % 50) * PAGE_SIZE
+        return 'GET', f'/users/?limit={PAGE_SIZE}&offset={offset}', {'headers': {'Authorization': f'Bearer {reader}'}}
+
+    def update(worker, n):
+        user_id = worker + 1
+        body = {'username': f'user{user_id - 1}-{n}', 'email': f'user{user_id - 1}@example.com', 'password': PASSWORD}
+        return 'PUT', f'/users/{user_id}', {'json': body, 'headers': {'Authorization': f'Bearer {update_tokens[user_id]}'}}
+
+    def delete(worker, n):
+        user_id = victims[n]
+        return 'DELETE', f'/users/{user_id}', {'headers': {'Authorization': f'Bearer {delete_tokens[user_id]}'}}
+
+    return {'login': login, 'create': create, 'list': list_users, 'update': update, 'delete': delete}
+
+
+async def drive(client: httpx.AsyncClient, build, requests: int, concurrency: int):
+    # `concurrency` workers tiram números de uma fila comum até completar `requests` requisições.
+    # Latência e req/s só das respostas 2xx: erros (503 do shedding, por exemplo) voltam rápido e
+    # deixariam os percentis menores e o req/s maior. Eles aparecem em status e error_ratio.
+    latencies = []
+    statuses = Counter()
+    counter = iter(range(requests))
+
+    async def worker(index):
+        for n in counter:
+            method, path, kwargs = build(index, n)
+            start = perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+            except httpx.HTTPError as exc:
+                statuses[type(exc).__name__] += 1
+                continue
+            statuses[str(response.status_code)] += 1
+            if response.is_success:
+                latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = perf_counter() - start
+
+    total = sum(statuses.values())
+    cuts = quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else (latencies or [None]) * 99
+    return {
+        'requests': total,
+        'successes': len(latencies),
+        'error_ratio': round(1 - len(latencies) / total, 4) if total else 0,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1),
+        **{
+            name: round(cut * 1000, 2) if cut is not None else None
+            for name, cut in (('p50_ms', cuts[49]), ('p95_ms', cuts[94]), ('p99_ms', cuts[98]))
+        },
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else None,
+        'status': dict(sorted(statuses.items())),
+    }
+
+
+def peak_rss_mib(pid: int):
+    # Pico de memória residente (VmHWM) do servidor e, somado, dos processos filhos (pool de hashing do Argon2).
+    # Só existe no Linux; fora dele devolve o ru_maxrss do processo atual quando o servidor roda nele mesmo.
+    def vm_hwm(process):
+        try:
+            status = Path(f'/proc/{process}/status').read_text(encoding='utf-8')
+        except OSError:
+            return 0
+        return next((int(line.split()[1]) for line in status.splitlines() if line.startswith('VmHWM:')), 0)
+
+    try:
+        children = Path(f'/proc/{pid}/task/{pid}/children').read_text(encoding='utf-8').split()
+    except OSError:
+        if pid != os.getpid():
+            return None
+        return {'server': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1), 'children': None}
+    return {'server': round(vm_hwm(pid) / 1024, 1), 'children': round(sum(vm_hwm(child) for child in children) / 1024, 1)}
+
+
+async def run_scenarios(client, pid, args):
+    builders = build_requests(args.users, args.requests, args.concurrency)
+    for n in range(args.warmup):
+        for name in ('list', 'login'):
+            method, path, kwargs = builders[name](0, n)
+            await client.request(method, path, **kwargs)
+    # Aquece conexões, caches do SQLAlchemy e o pool de hashing antes de medir.
+
+    results = {}
+    for name in args.scenarios:
+        results[name] = await drive(client, builders[name], args.requests, args.concurrency)
+        results[name]['peak_rss_mib'] = peak_rss_mib(pid)
+        # VmHWM só cresce: o valor depois de cada cenário mostra qual deles aumentou o pico.
+    return results
+
+
+async def run_in_process(args):
+    from fast_zero.app import create_app  # noqa: PLC0415
+
+    app = create_app()
+    # O Settings do app lê o DATABASE_URL do teste, definido no os.environ antes; o engine nasce no lifespan.
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=120) as client:
+            return await run_scenarios(client, os.getpid(), args)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(args, env):
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            '-m',
+            'uvicorn',
+            '--factory',
+            'fast_zero.app:create_app',
+            '--host',
+            '127.0.0.1',
+            '--port',
+            str(port),
+            '--log-level',
+            'warning',
+        ],
+        env=env,
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=120, limits=limits) as client:
+            for _ in range(300):
+                try:
+                    await client.get('/')
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError('uvicorn did not start')
+            return await run_scenarios(client, server.pid, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def git_commit():
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=False)
+    return result.stdout.strip() or None
+
+
+def failures(report: dict, max_error_ratio: float) -> list[str]:
+    # Cenário com erros demais não é comparável com nada: falha mesmo sem baseline.
+    return [
+        f'{name}: error ratio {result["error_ratio"]} ({result["status"]})'
+        for name, result in report['results'].items()
+        if result['error_ratio'] > max_error_ratio
+    ]
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    # Regressão = p95 ou p99 maior, ou req/s menor, que o baseline além da tolerância (0.2 => 20%).
+    found = []
+    for name, result in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if result[metric] is None or base[metric] is None:
+                continue
+            if result[metric] > base[metric] * (1 + tolerance):
+                found.append(f'{name}: {metric} {base[metric]} -> {result[metric]}')
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            found.append(f'{name}: rps {base["rps"]} -> {result["rps"]}')
+    return found
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'load.db'
+        url = f'sqlite+aiosqlite:///{path}' if args.driver == 'async' else f'sqlite:///{path}'
+        env = {**BENCH_ENV, **os.environ, 'DATABASE_URL': url}
+        os.environ.update(env)
+
+        from fast_zero.settings import get_settings  # noqa: PLC0415
+
+        settings = get_settings()
+        argon2_params = {
+            'time_cost': settings.ARGON2_TIME_COST,
+            'memory_cost': settings.ARGON2_MEMORY_COST,
+            'parallelism': settings.ARGON2_PARALLELISM,
+        }
+        start = perf_counter()
+        seed(f'sqlite:///{path}', args.users, argon2_params)
+        seed_seconds = perf_counter() - start
+
+        results = asyncio.run(run_in_process(args) if args.server == 'inprocess' else run_uvicorn(args, env))
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'server': args.server,
+        'driver': args.driver,
+        'users': args.users,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'argon2': argon2_params,
+        'seed_seconds': round(seed_seconds, 2),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--requests', type=int, default=1_000, help='requisições por cenário')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--server', choices=['inprocess', 'uvicorn'], default='inprocess')
+    parser.add_argument('--driver', choices=['sync', 'async'], default='async')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--output', type=Path)
+    parser.add_argument('--baseline', type=Path, help='JSON de uma execução anterior para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--max-error-ratio', type=float, default=0.01, help='fração máxima de respostas não 2xx por cenário')
+    args = parser.parse_args()
+    if args.users < args.requests + args.concurrency:
+        parser.error('--users must be at least --requests + --concurrency (updated and deleted users must not overlap)')
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + '\n')
+
+    found = failures(report, args.max_error_ratio)
+    if args.baseline:
+        found += regressions(report, json.loads(args.baseline.read_text()), args.tolerance)
+    if found:
+        sys.exit('load test failed:\n' + '\n'.join(found))
+
+
+if __name__ == '__main__':
+    main()
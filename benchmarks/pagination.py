@@ -0,0 +1,71 @@
+"""Compara a paginação por OFFSET com a paginação por cursor (keyset) em GET /users.
+
+Uso: python -m benchmarks.pagination --users 1000000 --pages 1 100 1000 10000
+"""
+
+import argparse
+import json
+import tempfile
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from fast_zero.models import User, table_registry
+
+
+def seed(engine, total: int, batch: int = 50_000):
+    table_registry.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for start in range(0, total, batch):
+            connection.execute(
+                insert(User),
+                [{'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'} for i in range(start, min(start + batch, total))],
+            )
+
+
+def timed(session, query, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        session.scalars(query).all()
+        samples.append(perf_counter() - start)
+    return median(samples) * 1000
+
+
+def run(total: int, pages: list[int], limit: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{Path(tmp) / "bench.db"}')
+        seed(engine, total)
+        results = []
+        with Session(engine) as session:
+            for page in pages:
+                offset = (page - 1) * limit
+                # O último id da página anterior, que é o que o cursor carrega.
+                last_id = session.scalar(select(User.id).order_by(User.id).offset(offset - 1).limit(1)) if offset else 0
+                offset_query = select(User).order_by(User.id).offset(offset).limit(limit + 1)
+                keyset_query = select(User).where(User.id > last_id).order_by(User.id).limit(limit + 1)
+                results.append({
+                    'page': page,
+                    'offset_ms': round(timed(session, offset_query, repeat), 3),
+                    'cursor_ms': round(timed(session, keyset_query, repeat), 3),
+                })
+        engine.dispose()
+    return {'users': total, 'limit': limit, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1_000, 10_000])
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.users, args.pages, args.limit, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compara a listagem de usuários com objetos ORM + UserList (caminho antigo) com linhas do Core + TypeAdapter.
+
+Uso: python -m benchmarks.user_listing --users 20000 --limits 10 100 1000
+"""
+
+import argparse
+import json
+import tempfile
+import tracemalloc
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from benchmarks.pagination import seed
+from fast_zero.models import User
+from fast_zero.routers.users import user_list_adapter
+from fast_zero.schemas import UserList
+
+
+def orm_page(session, limit):
+    users = session.scalars(select(User).order_by(User.id).limit(limit)).all()
+    return UserList.model_validate({'users': users}).model_dump_json().encode()
+
+
+def core_page(session, limit):
+    rows = session.execute(select(User.id, User.username, User.email).order_by(User.id).limit(limit)).all()
+    return user_list_adapter.dump_json({'users': [row._asdict() for row in rows], 'next_cursor': None})
+
+
+def measure(engine, page, limit, repeat):
+    samples = []
+    for _ in range(repeat):
+        with Session(engine) as session:
+            start = perf_counter()
+            page(session, limit)
+            samples.append(perf_counter() - start)
+
+    with Session(engine) as session:
+        tracemalloc.start()
+        page(session, limit)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {'median_ms': round(median(samples) * 1000, 3), 'peak_kib': round(peak / 1024, 1)}
+
+
+def run(total: int, limits: list[int], repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{Path(tmp) / "bench.db"}')
+        seed(engine, total)
+        results = [
+            {'limit': limit, 'orm': measure(engine, orm_page, limit, repeat), 'core': measure(engine, core_page, limit, repeat)} for limit in limits
+        ]
+        engine.dispose()
+    return {'users': total, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--limits', type=int, nargs='+', default=[10, 100, 1_000, 10_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.users, args.limits, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Mostra que a busca por prefixo de GET /users/search usa os índices lower(...) e compara com um LIKE sem índice.
+
+Uso: python -m benchmarks.user_search --users 1000000 --prefixes user1 user12345 USER99
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session
+
+from benchmarks.pagination import seed
+from fast_zero.models import User
+from fast_zero.routers.users import user_search_query
+
+
+def query_plan(session, query):
+    # EXPLAIN QUERY PLAN do SQLite: 'SEARCH ... USING INDEX' = faixa no índice, 'SCAN users' = leitura da tabela inteira.
+    sql = str(query.compile(session.bind, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def timed(session, query, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        session.execute(query).all()
+        samples.append(perf_counter() - start)
+    return median(samples) * 1000
+
+
+def run(total: int, prefixes: list[str], field: str, limit: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{Path(tmp) / "bench.db"}')
+        seed(engine, total)
+        # create_all do seed já cria os índices ix_users_username_lower / ix_users_email_lower do models.py.
+        results = []
+        with Session(engine) as session:
+            session.execute(text('ANALYZE'))
+            for prefix in prefixes:
+                indexed = user_search_query(field, prefix).limit(limit + 1)
+                column = getattr(User, field)
+                unindexed = select(User.id, User.username, User.email).where(column.ilike(f'{prefix}%')).order_by(func.lower(column), User.id)
+                unindexed = unindexed.limit(limit + 1)
+                # ILIKE vira lower(coluna) LIKE lower(...): o SQLite não consegue usar índice nesse formato.
+                plan = query_plan(session, indexed)
+                results.append({
+                    'prefix': prefix,
+                    'plan': plan,
+                    'uses_index': any(f'USING INDEX ix_users_{field}_lower' in step for step in plan)
+                    and not any(step.startswith('SCAN') for step in plan),
+                    'index_ms': round(timed(session, indexed, repeat), 3),
+                    'like_plan': query_plan(session, unindexed),
+                    'like_ms': round(timed(session, unindexed, repeat), 3),
+                })
+        engine.dispose()
+    return {'users': total, 'field': field, 'limit': limit, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--prefixes', nargs='+', default=['user1', 'user12345', 'USER99'])
+    parser.add_argument('--field', choices=['username', 'email'], default='username')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    report = run(args.users, args.prefixes, args.field, args.limit, args.repeat)
+    print(json.dumps(report, indent=2))
+    if not all(result['uses_index'] for result in report['results']):
+        sys.exit('search query is not using the lower() index')
+
+
+if __name__ == '__main__':
+    main()
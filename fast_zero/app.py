@@ -1,16 +1,177 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from http import HTTPStatus
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
+from fast_zero.audit import LoginAuditWriter
+from fast_zero.coalescing import SingleFlight
+from fast_zero.database import QueryStatsMiddleware, build_engine, build_replica_router, dispose_engine, pool_status
+from fast_zero.loadshedding import ConcurrencyLimitMiddleware, build_limiters
+from fast_zero.metrics import REGISTRY, Counter, Gauge, MetricsMiddleware
+from fast_zero.profiling import ProfilingMiddleware
+from fast_zero.ratelimit import MemoryBucketStorage
 from fast_zero.routers import auth, users
 from fast_zero.schemas import Message
+from fast_zero.security import build_hasher, build_login_limiters, build_principal_cache
+from fast_zero.server import warmup
+from fast_zero.settings import Settings, get_settings
 
-app = FastAPI()
 
-app.include_router(auth.router)
-app.include_router(users.router)
+async def check_replicas(app: FastAPI):
+    while True:
+        await app.state.replicas.check_health()
+        await asyncio.sleep(app.state.settings.REPLICA_RETRY_SECONDS)
+
+
+def app_engines(app: FastAPI) -> dict:
+    # Todos os engines do app pelo nome usado no label database das métricas.
+    state = app.state
+    if not hasattr(state, 'engine'):
+        return {}
+        # Lifespan ainda não rodou.
+    return {
+        'primary': state.engine,
+        **{f'replica-{index}': replica for index, replica in enumerate(state.replicas.engines)},
+        **{f'shard-{index}': shard for index, shard in enumerate(state.shard_engines, start=1)},
+    }
+
+
+def pool_metric(app: FastAPI, field: str):
+    def collect():
+        statuses = {name: pool_status(engine) for name, engine in app_engines(app).items()}
+        return {(name,): status[field] for name, status in statuses.items() if status is not None}
+
+    return collect
+
+
+def register_metrics(app: FastAPI):
+    # As métricas leem o estado do app; com vários apps no mesmo processo (testes) vale o último criado.
+    state = app.state
+    REGISTRY.register(Gauge('fast_zero_hashing_pending', 'Hashing operations running or queued.', function=lambda: state.hasher.pending))
+    REGISTRY.register(
+        Counter(
+            'fast_zero_hashing_rejected_total',
+            'Hashing operations rejected with 503 because the queue was full.',
+            function=lambda: state.hasher.stats.rejected,
+        )
+    )
+    REGISTRY.register(
+        Counter('fast_zero_principal_cache_hits_total', 'Authenticated principal cache hits.', function=lambda: state.principal_cache.hits)
+    )
+    REGISTRY.register(
+        Counter('fast_zero_principal_cache_misses_total', 'Authenticated principal cache misses.', function=lambda: state.principal_cache.misses)
+    )
+    REGISTRY.register(Gauge('fast_zero_login_audit_pending', 'Login audit events waiting to be written.', function=lambda: state.login_audit.pending))
+    REGISTRY.register(Gauge('fast_zero_db_pool_size', 'Connections kept open by the pool.', ['database'], function=pool_metric(app, 'size')))
+    REGISTRY.register(Gauge('fast_zero_db_pool_checked_out', 'Connections currently in use.', ['database'], function=pool_metric(app, 'checked_out')))
+    REGISTRY.register(
+        Gauge('fast_zero_db_pool_overflow', 'Connections open beyond the pool size.', ['database'], function=pool_metric(app, 'overflow'))
+    )
+
+
+def create_app(  # noqa: PLR0913
+    settings: Settings | None = None, *, engine=None, replicas=None, shard_engines=None, hasher=None, login_rate_storage=None
+) -> FastAPI:
+    # Monta o app a partir de um Settings. Engines e hasher nascem no lifespan, não na importação dos módulos;
+    # os que forem passados aqui (ex: nos testes) são usados no lugar e não são encerrados pelo app.
+    settings = settings or get_settings()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        state = app.state
+        owned_engines = []
+        state.engine = engine
+        if engine is None:
+            state.engine = build_engine(settings.DATABASE_URL, settings)
+            owned_engines.append(state.engine)
+        state.replicas = replicas
+        if replicas is None:
+            state.replicas = build_replica_router(settings)
+            owned_engines.extend(state.replicas.engines)
+        state.shard_engines = shard_engines
+        if shard_engines is None:
+            state.shard_engines = [
+                build_engine(url, settings, name=f'shard-{index}') for index, url in enumerate(settings.DATABASE_SHARD_URLS, start=1)
+            ]
+            # O shard 0 é o próprio DATABASE_URL.
+            owned_engines.extend(state.shard_engines)
+        state.hasher = hasher or build_hasher(settings)
+        # O PasswordHasher só sobe os processos do pool no primeiro hash (ou no warmup).
+        state.login_audit = LoginAuditWriter(
+            [state.engine, *state.shard_engines],
+            flush_interval=settings.LOGIN_AUDIT_FLUSH_MS / 1000,
+            batch_size=settings.LOGIN_AUDIT_BATCH_SIZE,
+            max_pending=settings.LOGIN_AUDIT_MAX_PENDING,
+        )
+        state.login_audit.start()
+
+        if settings.WARMUP_ON_STARTUP:
+            await warmup(app)
+            # O uvicorn só começa a aceitar conexões depois do startup do lifespan.
+        health_check = asyncio.create_task(check_replicas(app)) if state.replicas.engines else None
+        # Só existe checagem de saúde quando DATABASE_REPLICA_URLS está configurado.
+        try:
+            yield
+        finally:
+            if health_check is not None:
+                health_check.cancel()
+                with suppress(asyncio.CancelledError):
+                    await health_check
+            await state.login_audit.stop(settings.LOGIN_AUDIT_DRAIN_TIMEOUT_SECONDS)
+            # Grava os logins que ainda estão na fila antes de fechar os engines.
+            if hasher is None:
+                state.hasher.shutdown()
+                # Encerra os processos do pool de hashing junto com a aplicação.
+            for owned in owned_engines:
+                await dispose_engine(owned)
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.principal_cache = build_principal_cache(settings)
+    app.state.login_limiters = build_login_limiters(settings, login_rate_storage or MemoryBucketStorage())
+    app.state.read_flight = SingleFlight('users', ttl=settings.COALESCE_TTL_MS / 1000, enabled=settings.COALESCE_READS)
+    # Junta as leituras idênticas e simultâneas de GET /users e /users/search.
+    register_metrics(app)
+
+    app.add_middleware(QueryStatsMiddleware, settings=settings)
+    if settings.PROFILE_SAMPLE_RATE or settings.PROFILE_SECRET:
+        app.add_middleware(
+            ProfilingMiddleware,
+            directory=settings.PROFILE_DIR,
+            sample_rate=settings.PROFILE_SAMPLE_RATE,
+            secret=settings.PROFILE_SECRET,
+            mode=settings.PROFILE_MODE,
+            max_files=settings.PROFILE_MAX_FILES,
+            interval=settings.PROFILE_INTERVAL_MS / 1000,
+        )
+        # Por dentro do limitador de concorrência: requisições recusadas com 503 não ocupam o profiler.
+    if settings.CONCURRENCY_LIMITS_ENABLED:
+        app.add_middleware(ConcurrencyLimitMiddleware, limiters=build_limiters(settings))
+        # Fica por dentro do MetricsMiddleware, assim as requisições recusadas com 503 também aparecem nas métricas.
+    app.add_middleware(MetricsMiddleware)
+
+    app.include_router(auth.router)
+    app.include_router(users.router)
+    app.add_api_route('/', read_root, status_code=HTTPStatus.OK, response_model=Message)
+    app.add_api_route('/metrics', metrics, response_class=PlainTextResponse, include_in_schema=False)
+    return app
 
 
-@app.get('/', status_code=HTTPStatus.OK, response_model=Message)
 def read_root():
     return {'message': 'Olá Mundo'}
+
+
+def metrics():
+    # Métricas no formato texto do Prometheus.
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+
+def __getattr__(name: str):
+    # App do fastapi dev / uvicorn fast_zero.app:app, com o Settings do ambiente (.env).
+    # Criado no primeiro acesso ao atributo e não na importação: from fast_zero.app import create_app funciona sem ambiente.
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import perf_counter
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from fast_zero.metrics import REGISTRY, Counter, Histogram
+from fast_zero.models import LoginEvent, User, utcnow
+from fast_zero.sharding import SHARD_ID_STRIDE
+
+logger = logging.getLogger(__name__)
+
+LOGIN_AUDIT_EVENTS = REGISTRY.register(
+    Counter('fast_zero_login_audit_events_total', 'Login audit events by outcome (written, dropped, failed).', ['result'])
+)
+LOGIN_AUDIT_FLUSH = REGISTRY.register(Histogram('fast_zero_login_audit_flush_seconds', 'Time to write one batch of login audit events.'))
+
+_users = User.__table__
+UPDATE_LAST_LOGIN = (
+    update(_users)
+    .where(_users.c.id == bindparam('event_user_id'))
+    .values(last_login_at=bindparam('event_logged_in_at'), updated_at=_users.c.updated_at)
+)
+# updated_at=updated_at => o onupdate não roda: login não muda o ETag nem aparece no GET /users/changes.
+
+
+@dataclass
+class LoginAuditEvent:
+    user_id: int
+    ip: str | None
+    logged_in_at: datetime = field(default_factory=utcnow)
+
+
+class LoginAuditWriter:
+    # Write-behind do login: o POST /auth/token só coloca o evento numa fila em memória e responde.
+    # Uma task do app grava a fila a cada flush_interval segundos (ou antes, quando junta batch_size eventos),
+    # em uma transação por shard com executemany: INSERT em login_events e UPDATE de users.last_login_at.
+    # A fila tem tamanho máximo: se o banco não der conta, os eventos excedentes são descartados (e contados), o login nunca espera.
+    def __init__(self, engines: list, flush_interval: float = 0.5, batch_size: int = 500, max_pending: int = 10_000):
+        self.engines = engines
+        # engines[i] => shard i (o 0 é o DATABASE_URL), o mesmo shard do usuário.
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._batch_ready = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def record(self, user_id: int, ip: str | None):
+        try:
+            self._queue.put_nowait(LoginAuditEvent(user_id, ip))
+        except asyncio.QueueFull:
+            LOGIN_AUDIT_EVENTS.inc(result='dropped')
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float):
+        # Shutdown: o loop termina o lote em andamento, grava o que ficou na fila e sai.
+        # timeout => tempo máximo para não travar o desligamento com o banco lento ou fora do ar.
+        self._closing = True
+        self._batch_ready.set()
+        try:
+            await asyncio.wait_for(self._task or self.flush(), timeout)
+        except TimeoutError:
+            logger.warning('Login audit drain timed out, %d events lost', self.pending)
+            LOGIN_AUDIT_EVENTS.inc(self.pending, result='dropped')
+
+    async def _run(self):
+        while not self._closing:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def flush(self):
+        # Grava tudo o que está na fila agora, em lotes de no máximo batch_size eventos.
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait() for _ in range(min(self.batch_size, self._queue.qsize()))]
+            start = perf_counter()
+            for index, events in self._by_shard(batch).items():
+                try:
+                    await write_login_events(self.engines[index], events)
+                except SQLAlchemyError:
+                    # Um banco fora do ar não pode derrubar a task: o lote é descartado e o próximo segue.
+                    logger.exception('Could not write %d login audit events', len(events))
+                    LOGIN_AUDIT_EVENTS.inc(len(events), result='failed')
+                else:
+                    LOGIN_AUDIT_EVENTS.inc(len(events), result='written')
+            LOGIN_AUDIT_FLUSH.observe(perf_counter() - start)
+
+    def _by_shard(self, events: list[LoginAuditEvent]) -> dict[int, list[LoginAuditEvent]]:
+        groups = {}
+        for event in events:
+            index = event.user_id % SHARD_ID_STRIDE if len(self.engines) > 1 else 0
+            groups.setdefault(index, []).append(event)
+        return groups
+
+
+async def write_login_events(engine, events: list[LoginAuditEvent]):
+    rows = [{'user_id': event.user_id, 'ip': event.ip, 'logged_in_at': event.logged_in_at} for event in events]
+    last_login = {event.user_id: event.logged_in_at for event in events}
+    # Um UPDATE por usuário no lote, com o login mais recente (a fila está em ordem de chegada).
+    updates = [{'event_user_id': user_id, 'event_logged_in_at': logged_in_at} for user_id, logged_in_at in last_login.items()]
+
+    if isinstance(engine, AsyncEngine):
+        async with engine.begin() as connection:
+            await connection.execute(insert(LoginEvent), rows)
+            await connection.execute(UPDATE_LAST_LOGIN, updates)
+        return
+
+    def write():
+        with engine.begin() as connection:
+            connection.execute(insert(LoginEvent), rows)
+            connection.execute(UPDATE_LAST_LOGIN, updates)
+
+    await run_in_threadpool(write)
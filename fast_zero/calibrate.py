@@ -0,0 +1,92 @@
+"""Calibra o custo do Argon2 para o hardware atual e grava os parâmetros no .env.
+
+Uso: python -m fast_zero.calibrate --target-ms 250 --env-file .env
+"""
+
+import argparse
+import json
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+from fast_zero.hashing import build_password_hash
+
+OWASP_MIN_MEMORY_COST = 19456
+# 19 MiB, o mínimo recomendado pela OWASP para o Argon2id.
+
+
+def measure_verify_ms(time_cost: int, memory_cost: int, parallelism: int, samples: int = 5) -> float:
+    # Mede a verificação, que é o que pesa no login (o hash só acontece no cadastro).
+    pwd_context = build_password_hash(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    hashed = pwd_context.hash('calibration-password')
+    timings = []
+    for _ in range(samples):
+        start = perf_counter()
+        pwd_context.verify('calibration-password', hashed)
+        timings.append((perf_counter() - start) * 1000)
+    return median(timings)
+
+
+def calibrate(  # noqa: PLR0913
+    target_ms: float,
+    *,
+    memory_cost: int = 65536,
+    parallelism: int = 4,
+    min_memory_cost: int = OWASP_MIN_MEMORY_COST,
+    max_time_cost: int = 20,
+    samples: int = 5,
+):
+    # Maior time_cost cuja verificação fica abaixo do alvo. Se nem time_cost=1 cabe no alvo,
+    # reduz a memória pela metade (até min_memory_cost) e tenta de novo.
+    while True:
+        best = None
+        for time_cost in range(1, max_time_cost + 1):
+            verify_ms = measure_verify_ms(time_cost, memory_cost, parallelism, samples)
+            if verify_ms > target_ms:
+                break
+            best = {'time_cost': time_cost, 'memory_cost': memory_cost, 'parallelism': parallelism, 'verify_ms': round(verify_ms, 2)}
+
+        if best is not None:
+            return best
+        if memory_cost // 2 < min_memory_cost:
+            return {'time_cost': 1, 'memory_cost': memory_cost, 'parallelism': parallelism, 'verify_ms': round(verify_ms, 2)}
+        memory_cost //= 2
+
+
+def write_env(path: Path, values: dict):
+    # Atualiza as chaves que já existem no .env e acrescenta as que faltam, mantendo o resto do arquivo.
+    lines = path.read_text(encoding='utf-8').splitlines() if path.exists() else []
+    pending = dict(values)
+    for index, line in enumerate(lines):
+        key = line.split('=', 1)[0].strip()
+        if key in pending:
+            lines[index] = f'{key}={pending.pop(key)}'
+    lines.extend(f'{key}={value}' for key, value in pending.items())
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--target-ms', type=float, default=250)
+    parser.add_argument('--memory-cost', type=int, default=65536, help='memória inicial em KiB')
+    parser.add_argument('--parallelism', type=int, default=4)
+    parser.add_argument('--env-file', type=Path, default=Path('.env'))
+    parser.add_argument('--dry-run', action='store_true', help='só mostra o resultado, sem alterar o .env')
+    args = parser.parse_args()
+
+    result = calibrate(args.target_ms, memory_cost=args.memory_cost, parallelism=args.parallelism)
+    print(json.dumps(result, indent=2))
+
+    if not args.dry_run:
+        write_env(
+            args.env_file,
+            {
+                'ARGON2_TIME_COST': result['time_cost'],
+                'ARGON2_MEMORY_COST': result['memory_cost'],
+                'ARGON2_PARALLELISM': result['parallelism'],
+            },
+        )
+
+
+if __name__ == '__main__':
+    main()
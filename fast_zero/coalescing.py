@@ -0,0 +1,75 @@
+import asyncio
+
+from fastapi import Request
+
+from fast_zero.cache import TTLCache
+from fast_zero.database import get_replicas, token_subject
+from fast_zero.metrics import REGISTRY, Counter
+
+COALESCED = REGISTRY.register(
+    Counter('fast_zero_coalesced_requests_total', 'Coalesced reads by outcome (executed, merged, cached).', ['name', 'result'])
+)
+
+
+class SingleFlight:
+    # Junta leituras idênticas que chegam ao mesmo tempo: a primeira executa, as outras esperam e recebem o mesmo resultado.
+    # ttl > 0 => o resultado ainda fica guardado por alguns milissegundos para quem chegar logo depois.
+    def __init__(self, name: str, ttl: float = 0.0, maxsize: int = 1024, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.recent = TTLCache(maxsize=maxsize, ttl=ttl) if ttl > 0 else None
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        if not self.enabled:
+            return await fn()
+
+        while True:
+            if self.recent is not None:
+                cached = self.recent.get(key)
+                if cached is not None:
+                    COALESCED.inc(name=self.name, result='cached')
+                    return cached
+
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                result = await asyncio.shield(future)
+                # shield => se quem está esperando for cancelado, a execução dos outros continua.
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    continue
+                    # Quem executava foi cancelado (ex: cliente desconectou): tenta de novo, talvez executando.
+                raise
+            COALESCED.inc(name=self.name, result='merged')
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()
+            # Marca a exceção como lida: sem ninguém esperando o asyncio reclamaria no log.
+            raise
+        finally:
+            del self._inflight[key]
+
+        future.set_result(result)
+        if self.recent is not None:
+            self.recent.set(key, result)
+        COALESCED.inc(name=self.name, result='executed')
+        return result
+
+
+def coalescing_key(request: Request):
+    # Rota + parâmetros + escopo. As listagens são iguais para qualquer usuário autenticado, então o escopo é compartilhado,
+    # exceto para quem escreveu há pouco: esse não pode receber uma leitura que começou antes da própria escrita.
+    subject = token_subject(request)
+    scope = subject if subject and get_replicas(request).recent_writes.get(subject) else 'shared'
+    return request.scope['route'].path, tuple(sorted(request.query_params.multi_items())), scope
@@ -1,12 +1,420 @@
-from sqlalchemy import create_engine
+import logging
+import re
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from time import monotonic, perf_counter
+
+import jwt
+from fastapi import Depends, Request
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy import URL, Engine, create_engine, event, make_url, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.datastructures import MutableHeaders
+
+from fast_zero.cache import TTLCache
+from fast_zero.metrics import DB_POOL_WAIT, DB_QUERY_DURATION
+from fast_zero.settings import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_async_url(url: str) -> bool:
+    # O modo assíncrono é escolhido pela própria URL do banco, ex: sqlite+aiosqlite:// ou postgresql+asyncpg://
+    # Se o driver do dialeto for assíncrono usamos create_async_engine, senão o create_engine tradicional.
+    return make_url(url).get_dialect().is_async
+
+
+class TimedPool:
+    # Mixin do QueuePool: mede quanto cada checkout esperou por uma conexão (inclui abrir uma nova enquanto o pool não enche).
+    database = 'primary'
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(perf_counter() - start, database=self.database)
+
+    def recreate(self):
+        # engine.dispose() troca o pool por um novo da mesma classe; o nome do banco vai junto.
+        pool = super().recreate()
+        pool.database = self.database
+        return pool
+
+
+class TimedQueuePool(TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def is_memory_url(url: URL) -> bool:
+    return url.get_backend_name() == 'sqlite' and (url.database in {None, '', ':memory:'} or url.query.get('mode') == 'memory')
+
+
+def sqlite_pragmas(settings: Settings) -> dict[str, str | int]:
+    return {
+        'journal_mode': settings.SQLITE_JOURNAL_MODE,
+        'synchronous': settings.SQLITE_SYNCHRONOUS,
+        'busy_timeout': settings.SQLITE_BUSY_TIMEOUT_MS,
+        'cache_size': -settings.SQLITE_CACHE_SIZE_KIB,
+        # Negativo => tamanho em KiB, positivo seria em páginas.
+        'mmap_size': settings.SQLITE_MMAP_SIZE_MIB * 1024 * 1024,
+    }
+
+
+def engine_options(url: str, settings: Settings) -> dict:
+    # Perfil do engine por dialeto, a partir do Settings: tamanho e reciclagem do pool, cache de statements e connect_args do driver.
+    url = make_url(url)
+    backend, driver = url.get_backend_name(), url.get_driver_name()
+    cache_size = settings.DB_STATEMENT_CACHE_SIZE
+    options = {'pool_pre_ping': settings.DB_POOL_PRE_PING, 'query_cache_size': cache_size}
+    connect_args = {}
+
+    if not is_memory_url(url):
+        # SQLite em memória usa um pool de uma conexão só (StaticPool/SingletonThreadPool): não tem tamanho nem espera.
+        options.update(
+            poolclass=TimedAsyncQueuePool if url.get_dialect().is_async else TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        )
+    if backend == 'sqlite':
+        connect_args['cached_statements'] = cache_size
+        # sqlite3 e aiosqlite: statements preparados guardados por conexão.
+    elif driver == 'asyncpg':
+        connect_args['prepared_statement_cache_size'] = cache_size
+    elif driver == 'psycopg' and not cache_size:
+        connect_args['prepare_threshold'] = None
+        # psycopg prepara sozinho os comandos repetidos; None desliga (ex: atrás de um pgbouncer em modo transaction).
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def build_engine(url: str, settings: Settings, name: str = 'primary'):
+    # name => label database das métricas do pool (primary, replica-0, shard-1...).
+    options = engine_options(url, settings)
+    engine = create_async_engine(url, **options) if is_async_url(url) else create_engine(url, **options)
+    if isinstance(engine.pool, TimedPool):
+        engine.pool.database = name
+
+    if make_url(url).get_backend_name() == 'sqlite':
+        pragmas = sqlite_pragmas(settings)
+
+        def set_pragmas(dbapi_connection, connection_record):
+            # Roda em cada conexão nova do pool. No aiosqlite o cursor do adaptador também é síncrono aqui dentro.
+            cursor = dbapi_connection.cursor()
+            for pragma, value in pragmas.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+            cursor.close()
+
+        event.listen(engine.sync_engine if isinstance(engine, AsyncEngine) else engine, 'connect', set_pragmas)
+    return engine
+
+
+def pool_status(engine) -> dict[str, int] | None:
+    # Estado atual do pool para as métricas. None => pool sem tamanho fixo (StaticPool, NullPool...).
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    return {'size': pool.size(), 'checked_out': pool.checkedout(), 'overflow': max(pool.overflow(), 0)}
+    # overflow() começa em -pool_size e só passa de 0 quando há conexões além do pool_size.
+
+
+@dataclass
+class QueryStats:
+    # Estatísticas de SQL de uma única requisição.
+    count: int = 0
+    duration: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+    # quantas vezes cada formato de comando (SQL normalizado) rodou
+    repeated: set = field(default_factory=set)
+    # formatos que passaram de N_PLUS_ONE_THRESHOLD execuções (provável N+1)
+    slow_query_ms: float = 200
+    n_plus_one_threshold: int = 10
+    # Limites do Settings do app, copiados pelo QueryStatsMiddleware.
+
+
+query_stats: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+# O ContextVar acompanha a requisição: é copiado para o threadpool (modo sync) e para o greenlet do SQLAlchemy (modo async).
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%s|:\w+|\$\d+")
+_SQL_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(statement: str) -> str:
+    # Troca literais e parâmetros por ?, listas (?, ?, ?) por (...) e junta os espaços:
+    # comandos com o mesmo formato ficam iguais, independente dos valores.
+    statement = _SQL_LITERALS.sub('?', statement)
+    statement = _SQL_IN_LISTS.sub('(...)', statement)
+    return ' '.join(statement.split())
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913, PLR0917
+    # Ouvindo a classe Engine os eventos valem para todos os engines, inclusive o sync_engine por trás dos AsyncEngine.
+    context.query_start_time = perf_counter()
+    # No contexto de execução (um por comando) e não no conn.info: um comando que falha não passa pelo after_cursor_execute
+    # e o início dele é descartado junto com o contexto, sem acumular na conexão.
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913, PLR0917
+    elapsed = perf_counter() - context.query_start_time
+    DB_QUERY_DURATION.observe(elapsed)
+
+    stats = query_stats.get()
+    slow_query_ms = stats.slow_query_ms if stats is not None else get_settings().SLOW_QUERY_MS
+    if elapsed * 1000 >= slow_query_ms:
+        logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, normalize_sql(statement))
+
+    if stats is None:
+        # Fora de uma requisição (scripts, migrações, testes chamando a sessão direto).
+        return
+
+    stats.count += 1
+    stats.duration += elapsed
+    shape = normalize_sql(statement)
+    stats.shapes[shape] += 1
+    if stats.shapes[shape] == stats.n_plus_one_threshold + 1:
+        stats.repeated.add(shape)
+        logger.warning('Possible N+1: statement executed more than %d times in one request: %s', stats.n_plus_one_threshold, shape)
+
+
+class QueryStatsMiddleware:
+    # Abre um QueryStats para cada requisição e, com DB_DEBUG_HEADERS ligado,
+    # devolve X-DB-Queries (quantidade de comandos) e X-DB-Time (ms) nos headers da resposta.
+    def __init__(self, app, settings: Settings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(slow_query_ms=self.settings.SLOW_QUERY_MS, n_plus_one_threshold=self.settings.N_PLUS_ONE_THRESHOLD)
+        token = query_stats.set(stats)
 
-from fast_zero.settings import Settings
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start' and self.settings.DB_DEBUG_HEADERS:
+                headers = MutableHeaders(scope=message)
+                headers.append('X-DB-Queries', str(stats.count))
+                headers.append('X-DB-Time', f'{stats.duration * 1000:.2f}')
+            await send(message)
 
-engine = create_engine(Settings().DATABASE_URL)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            query_stats.reset(token)
 
 
+class ThreadedSession:
+    # Adaptador que expõe a mesma API assíncrona do AsyncSession sobre uma Session síncrona.
+    # Assim os endpoints são sempre async def e usam await, independente do driver configurado.
+    # Cada operação de banco roda no threadpool para não bloquear o event loop.
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    @property
+    def bind(self):
+        return self.sync_session.bind
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def merge(self, instance, **kwargs):
+        return await run_in_threadpool(self.sync_session.merge, instance, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def refresh(self, instance, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        # Mesmo contrato do AsyncSession.run_sync: fn recebe a Session síncrona como primeiro argumento.
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
+async def stream_rows(bind, statement, yield_per: int = 1000):
+    # Lê o resultado com cursor do lado do servidor (yield_per/stream_results), em lotes de yield_per linhas,
+    # então a memória fica constante mesmo para tabelas enormes.
+    # Usa uma conexão própria: a sessão da requisição pode ser fechada antes da resposta em streaming terminar.
+    if isinstance(bind, AsyncEngine):
+        async with bind.connect() as connection:
+            result = await connection.stream(statement.execution_options(yield_per=yield_per))
+            async for partition in result.partitions():
+                yield partition
+        return
+
+    def partitions():
+        with bind.connect() as connection:
+            yield from connection.execution_options(yield_per=yield_per).execute(statement).partitions()
+
+    sync_partitions = partitions()
+    try:
+        async for partition in iterate_in_threadpool(sync_partitions):
+            yield partition
+    finally:
+        await run_in_threadpool(sync_partitions.close)
+        # Fecha a conexão mesmo se o cliente desconectar no meio do download.
+
+
+class ReplicaRouter:
+    # Escolhe a réplica de leitura de cada requisição: round-robin entre as réplicas saudáveis.
+    # Réplica com erro de conexão fica fora da rotação por retry_after segundos (a checagem de saúde pode trazê-la antes).
+    # Quem escreveu há pouco lê do primário por read_your_writes segundos, para não ver dados antigos por causa do atraso da replicação.
+    def __init__(self, engines: list, retry_after: float = 5, read_your_writes: float = 5):
+        self.engines = []
+        self.retry_after = retry_after
+        self.recent_writes = TTLCache(maxsize=10_000, ttl=read_your_writes)
+        self._down_until = {}
+        self._next = 0
+        for replica in engines:
+            self.add(replica)
+
+    def add(self, replica):
+        self.engines.append(replica)
+        sync_engine = replica.sync_engine if isinstance(replica, AsyncEngine) else replica
+        event.listen(sync_engine, 'handle_error', partial(self._on_error, replica))
+        # Erro de conexão durante uma requisição já tira a réplica da rotação, sem esperar a próxima checagem.
+
+    def _on_error(self, replica, context):
+        if isinstance(context.sqlalchemy_exception, OperationalError):
+            self.mark_down(replica)
+
+    def mark_down(self, replica):
+        self._down_until[replica] = monotonic() + self.retry_after
+
+    def mark_write(self, *subjects: str):
+        for subject in subjects:
+            self.recent_writes.set(subject, True)
+
+    def choose(self, subject: str | None = None):
+        # None => usar o primário (sem réplicas, todas fora do ar ou escrita recente de quem está lendo).
+        if not self.engines or (subject and self.recent_writes.get(subject)):
+            return None
+
+        now = monotonic()
+        for _ in range(len(self.engines)):
+            replica = self.engines[self._next % len(self.engines)]
+            self._next += 1
+            if self._down_until.get(replica, 0) <= now:
+                return replica
+        return None
+
+    async def check_health(self):
+        # SELECT 1 em cada réplica: a que responde volta para a rotação, a que falha sai.
+        for replica in self.engines:
+            try:
+                if isinstance(replica, AsyncEngine):
+                    async with replica.connect() as connection:
+                        await connection.execute(text('SELECT 1'))
+                else:
+                    await run_in_threadpool(_ping, replica)
+            except DBAPIError:
+                self.mark_down(replica)
+            else:
+                self._down_until.pop(replica, None)
+
+
+def _ping(sync_engine: Engine):
+    with sync_engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+
+
+def build_replica_router(settings: Settings) -> ReplicaRouter:
+    return ReplicaRouter(
+        [build_engine(url, settings, name=f'replica-{index}') for index, url in enumerate(settings.DATABASE_REPLICA_URLS)],
+        retry_after=settings.REPLICA_RETRY_SECONDS,
+        read_your_writes=settings.READ_YOUR_WRITES_SECONDS,
+    )
+
+
+def token_subject(request: Request) -> str | None:
+    # O sub do token só é usado para decidir entre réplica e primário, por isso não precisamos validar a assinatura aqui:
+    # a autenticação de verdade continua no get_current_user.
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return jwt.decode(token, options={'verify_signature': False}).get('sub')
+    except jwt.PyJWTError:
+        return None
+
+
+@asynccontextmanager
+async def open_session(bind):
+    # expire_on_commit=False => os objetos continuam acessíveis depois do commit sem novo SELECT (obrigatório no modo async)
+    if isinstance(bind, AsyncEngine):
+        async with AsyncSession(bind, expire_on_commit=False) as session:
+            yield session
+    else:
+        with Session(bind, expire_on_commit=False) as session:
+            yield ThreadedSession(session)
+
+
+async def dispose_engine(engine):
+    if isinstance(engine, AsyncEngine):
+        await engine.dispose()
+    else:
+        engine.dispose()
+
+
+# Os engines são do app (criados no lifespan do create_app, ver app.py) e não do módulo: importar o database não conecta em nada.
 # Dependency para obter uma sessão de banco de dados sem precisar ficar repetindo o código em cada endpoint. no app.py
-def get_session():  # pragma: no cover
-    with Session(engine) as session:
+async def get_session(request: Request):
+    async with open_session(request.app.state.engine) as session:
         yield session
+
+
+def get_replicas(request: Request) -> ReplicaRouter:
+    return request.app.state.replicas
+
+
+async def get_read_session(request: Request, session=Depends(get_session)):
+    # Sessão para endpoints só de leitura: vai para uma réplica quando existe uma disponível,
+    # senão reaproveita a sessão do primário da própria requisição.
+    replica = get_replicas(request).choose(token_subject(request))
+    if replica is None:
+        yield session
+        return
+
+    async with open_session(replica) as replica_session:
+        yield replica_session
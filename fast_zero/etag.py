@@ -0,0 +1,37 @@
+from hashlib import blake2b
+from http import HTTPStatus
+
+from fastapi import Request, Response
+
+
+def make_etag(*versions) -> str:
+    # ETag forte: hash do (id, updated_at) de cada usuário da resposta. Qualquer alteração muda o updated_at,
+    # e inclusão/remoção muda a lista de ids, então o ETag só se repete quando o conteúdo é o mesmo.
+    digest = blake2b(digest_size=16)
+    for user_id, updated_at in versions:
+        digest.update(f'{user_id}:{updated_at.isoformat()};'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    # If-None-Match usa a comparação fraca (RFC 9110): W/"x" e "x" são iguais; * vale para qualquer recurso que exista.
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = {candidate.strip().removeprefix('W/') for candidate in header.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+def cache_headers(request: Request, etag: str) -> dict:
+    headers = {'ETag': etag}
+    route = request.scope.get('route')
+    cache_control = request.app.state.settings.CACHE_CONTROL.get(getattr(route, 'path', None))
+    # Cache-Control configurado por rota (template do caminho, ex: /users/{user_id}).
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    return headers
+
+
+def not_modified(request: Request, etag: str) -> Response:
+    # 304 sem corpo: o cliente reaproveita a cópia que já tem.
+    return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=cache_headers(request, etag))
@@ -0,0 +1,140 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from time import perf_counter
+
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from fast_zero.metrics import HASH_DURATION, HASH_QUEUE_WAIT
+
+_pwd_context = None
+
+
+def build_password_hash(**argon2_params):
+    # argon2_params => time_cost, memory_cost (KiB) e parallelism; o que não for informado usa o padrão do argon2-cffi.
+    return PasswordHash((Argon2Hasher(**argon2_params),))
+
+
+def _init_worker(argon2_params: dict):
+    # Cada processo do pool cria o próprio PasswordHash uma única vez, com os parâmetros calibrados.
+    global _pwd_context  # noqa: PLW0603
+    _pwd_context = build_password_hash(**argon2_params)
+
+
+def _context():
+    if _pwd_context is None:
+        _init_worker({})
+    return _pwd_context
+
+
+def _hash(password: str):
+    # Roda dentro do processo worker. Retorna também quanto tempo o Argon2 levou de fato.
+    start = perf_counter()
+    hashed = _context().hash(password)
+    return hashed, perf_counter() - start
+
+
+def _hash_many(passwords: list[str]):
+    start = perf_counter()
+    hashed = [_context().hash(password) for password in passwords]
+    return hashed, perf_counter() - start
+
+
+def _verify(plain_password: str, hashed_password: str):
+    start = perf_counter()
+    valid = _context().verify(plain_password, hashed_password)
+    return valid, perf_counter() - start
+
+
+def _verify_and_update(plain_password: str, hashed_password: str):
+    # Além de verificar, devolve um novo hash quando o atual foi gerado com parâmetros diferentes dos configurados.
+    start = perf_counter()
+    result = _context().verify_and_update(plain_password, hashed_password)
+    return result, perf_counter() - start
+
+
+class HashingQueueFull(Exception):
+    # Levantada quando já existem workers + queue_depth operações pendentes no pool.
+    pass
+
+
+@dataclass
+class HashingStats:
+    completed: int = 0
+    rejected: int = 0
+    queue_wait_seconds: float = 0.0
+    # tempo total que as operações ficaram esperando um worker livre
+    hash_seconds: float = 0.0
+    # tempo total gasto pelo Argon2 dentro dos workers
+
+
+class PasswordHasher:
+    # Executor dedicado para o Argon2: os hashes rodam em processos separados,
+    # assim não disputam o GIL nem as threads do threadpool com os endpoints baratos.
+    def __init__(self, workers: int, queue_depth: int, argon2_params: dict | None = None):
+        self.workers = workers
+        self.argon2_params = argon2_params or {}
+        self.max_pending = workers + queue_depth
+        self.pending = 0
+        self.stats = HashingStats()
+        self._executor = None
+
+    @property
+    def executor(self):
+        # O pool só é criado no primeiro uso. spawn => o worker não herda threads/conexões do processo pai.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.argon2_params,),
+            )
+        return self._executor
+
+    async def _submit(self, operation: str, fn, *args):
+        if self.pending >= self.max_pending:
+            # Backpressure: melhor recusar na hora do que deixar a fila crescer sem limite.
+            self.stats.rejected += 1
+            raise HashingQueueFull
+
+        self.pending += 1
+        start = perf_counter()
+        try:
+            result, duration = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+        queue_wait = max(perf_counter() - start - duration, 0.0)
+        self.stats.completed += 1
+        self.stats.hash_seconds += duration
+        self.stats.queue_wait_seconds += queue_wait
+        HASH_DURATION.observe(duration, operation=operation)
+        HASH_QUEUE_WAIT.observe(queue_wait, operation=operation)
+        return result
+
+    async def hash(self, password: str):
+        return await self._submit('hash', _hash, password)
+
+    async def hash_many(self, passwords: list[str], chunk_size: int = 64):
+        # Hash em lote: cada envio ao pool leva um pedaço da lista (menos idas e voltas entre processos)
+        # e no máximo `workers` pedaços ficam pendentes por vez, para não ocupar a fila inteira.
+        chunks = [passwords[start : start + chunk_size] for start in range(0, len(passwords), chunk_size)]
+        hashed = []
+        for start in range(0, len(chunks), self.workers):
+            results = await asyncio.gather(*(self._submit('hash_many', _hash_many, chunk) for chunk in chunks[start : start + self.workers]))
+            for result in results:
+                hashed.extend(result)
+        return hashed
+
+    async def verify(self, plain_password: str, hashed_password: str):
+        return await self._submit('verify', _verify, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str):
+        return await self._submit('verify', _verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
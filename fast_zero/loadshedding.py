@@ -0,0 +1,191 @@
+import asyncio
+import math
+from collections import deque
+from http import HTTPStatus
+from time import perf_counter
+
+from starlette.responses import JSONResponse
+
+from fast_zero.metrics import REGISTRY, Counter, Gauge
+
+REQUESTS_SHED = REGISTRY.register(Counter('fast_zero_requests_shed_total', 'Requests rejected with 503 by the concurrency limiter.', ['route_class']))
+
+
+class AdaptiveLimiter:
+    # Limite de requisições simultâneas que se ajusta sozinho (AIMD):
+    # - resposta dentro da latência alvo => limite sobe devagar (+1 a cada `limit` requisições)
+    # - resposta lenta ou erro 5xx => limite cai de uma vez (multiplica por `backoff`)
+    # Quando o limite está cheio a requisição espera em fila até queue_timeout; com a fila cheia (max_queue) falha na hora.
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        target_latency: float,
+        queue_timeout: float,
+        backoff: float = 0.9,
+        max_queue: int = 256,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.avg_latency = target_latency
+        # média móvel exponencial da latência, só para o Retry-After: ela só é atualizada por quem foi admitido,
+        # então depois de uma rajada lenta fica alta e não serve para decidir quem entra na fila.
+        self._waiters = deque()
+
+    def estimated_wait(self):
+        return (len(self._waiters) + 1) * self.avg_latency / max(self.limit, 1)
+
+    async def acquire(self) -> bool:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+
+        if len(self._waiters) >= self.max_queue:
+            # Fila cheia: falha rápido em vez de acumular requisições que vão estourar o deadline.
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            # O deadline vale para a espera real na fila, não para uma estimativa.
+            return True
+        except TimeoutError:
+            # A vaga pode ter sido entregue no mesmo instante do timeout.
+            return waiter.done() and not waiter.cancelled()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._free_slot()
+                # O cliente desistiu depois de ganhar a vaga: devolve para o próximo da fila.
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency: float, failed: bool):
+        self.avg_latency = 0.9 * self.avg_latency + 0.1 * latency
+        if failed or latency > self.target_latency:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self._free_slot()
+
+    def _free_slot(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # A vaga passa direto para quem está esperando.
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+ROUTE_CLASSES = ('auth', 'hash', 'write', 'read', 'export')
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+HASH_METHODS = {'POST', 'PUT', 'PATCH'}
+EXPORT_PATH = '/users/export'
+
+
+def route_class(scope) -> str:
+    path = scope['path'].rstrip('/') or '/'
+    # Com e sem a barra final: POST /users também chega aqui (antes do redirect do FastAPI).
+    method = scope['method']
+    if path.startswith('/auth'):
+        return 'auth'
+    if method in READ_METHODS:
+        return 'export' if path == EXPORT_PATH else 'read'
+        # O export segura a vaga durante todo o download: limite próprio, para não ocupar as vagas das leituras curtas.
+    if method in HASH_METHODS and (path == '/users' or path.startswith('/users/')):
+        # Cadastro, PUT e PATCH (que pode trazer senha nova; o corpo não é lido aqui) calculam um hash Argon2
+        # (centenas de ms): uma rajada deles não derruba o limite das escritas baratas (DELETE).
+        return 'hash'
+    return 'write'
+
+
+class ConcurrencyLimitMiddleware:
+    # Um AdaptiveLimiter por classe de rota (auth, hash, write, read): login lento por causa do Argon2
+    # não ocupa as vagas das leituras baratas.
+    def __init__(self, app, limiters: dict[str, AdaptiveLimiter], exempt_paths=('/metrics',)):
+        self.app = app
+        self.limiters = limiters
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[route_class(scope)]
+        if not await limiter.acquire():
+            REQUESTS_SHED.inc(route_class=limiter.name)
+            response = JSONResponse(
+                {'detail': 'Server is busy, try again later'},
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(max(1, math.ceil(limiter.estimated_wait())))},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = perf_counter()
+        status = 500
+        latency = None
+
+        async def send_with_status(message):
+            nonlocal status, latency
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                latency = perf_counter() - start
+                # Latência até o início da resposta: um streaming longo (export) não conta como resposta lenta.
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            limiter.release(perf_counter() - start if latency is None else latency, failed=status >= HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def build_limiters(settings) -> dict[str, AdaptiveLimiter]:
+    missing = set(ROUTE_CLASSES) - set(settings.CONCURRENCY_TARGET_LATENCY_MS)
+    if missing:
+        # Falha na criação do app, e não com KeyError na primeira requisição da classe.
+        raise ValueError(f'CONCURRENCY_TARGET_LATENCY_MS is missing route classes: {", ".join(sorted(missing))}')
+    max_limits = {'export': settings.CONCURRENCY_EXPORT_MAX_LIMIT}
+    limiters = {
+        name: AdaptiveLimiter(
+            name,
+            initial_limit=min(settings.CONCURRENCY_INITIAL_LIMIT, max_limits.get(name, settings.CONCURRENCY_MAX_LIMIT)),
+            min_limit=min(settings.CONCURRENCY_MIN_LIMIT, max_limits.get(name, settings.CONCURRENCY_MAX_LIMIT)),
+            max_limit=max_limits.get(name, settings.CONCURRENCY_MAX_LIMIT),
+            target_latency=target_ms / 1000,
+            queue_timeout=settings.CONCURRENCY_QUEUE_TIMEOUT_MS / 1000,
+            max_queue=settings.CONCURRENCY_MAX_LIMIT,
+        )
+        for name, target_ms in settings.CONCURRENCY_TARGET_LATENCY_MS.items()
+    }
+    REGISTRY.register(
+        Gauge(
+            'fast_zero_concurrency_limit',
+            'Current adaptive concurrency limit.',
+            ['route_class'],
+            function=lambda: {(name,): int(limiter.limit) for name, limiter in limiters.items()},
+        )
+    )
+    REGISTRY.register(
+        Gauge(
+            'fast_zero_concurrency_in_flight',
+            'Requests holding a concurrency slot.',
+            ['route_class'],
+            function=lambda: {(name,): limiter.in_flight for name, limiter in limiters.items()},
+        )
+    )
+    return limiters
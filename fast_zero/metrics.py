@@ -0,0 +1,159 @@
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+# Implementação mínima do formato texto do Prometheus, sem dependência externa.
+# Cada métrica guarda os valores em um dicionário indexado pela tupla de labels;
+# o Lock é necessário porque parte das observações vem das threads do threadpool (ex: tempo de banco).
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        # function => métrica calculada na hora da coleta (ex: tamanho de uma fila que já existe em outro objeto).
+        self._values = {}
+        self._lock = Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            if isinstance(value, dict):
+                # Com labels a função devolve {(valor_label, ...): valor}.
+                return [(self.name, _format_labels(self.labelnames, key), item) for key, item in value.items()]
+            return [(self.name, '', value)]
+        with self._lock:
+            return [(self.name, _format_labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {value}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        # Guarda a contagem só do bucket em que o valor caiu; o acumulado (le=...) é montado na coleta.
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', _format_labels(self.labelnames, key, [('le', bound)]), cumulative))
+            samples.append((f'{self.name}_sum', _format_labels(self.labelnames, key), total))
+            samples.append((f'{self.name}_count', _format_labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter('fast_zero_http_requests_total', 'Total HTTP requests.', ['method', 'route', 'status']))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge('fast_zero_http_requests_in_flight', 'HTTP requests currently being served.'))
+HTTP_LATENCY = REGISTRY.register(Histogram('fast_zero_http_request_duration_seconds', 'HTTP request latency.', ['method', 'route', 'status']))
+HASH_DURATION = REGISTRY.register(Histogram('fast_zero_password_hash_duration_seconds', 'Argon2 time inside the hashing workers.', ['operation']))
+HASH_QUEUE_WAIT = REGISTRY.register(Histogram('fast_zero_password_hash_queue_wait_seconds', 'Time waiting for a free hashing worker.', ['operation']))
+DB_QUERY_DURATION = REGISTRY.register(Histogram('fast_zero_db_query_duration_seconds', 'Execution time of each SQL statement.'))
+DB_POOL_WAIT = REGISTRY.register(Histogram('fast_zero_db_pool_wait_seconds', 'Time waiting for a pooled database connection.', ['database']))
+
+
+class MetricsMiddleware:
+    # Middleware ASGI puro (sem BaseHTTPMiddleware) para o custo por requisição ficar mínimo.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        status = 500
+        # Se a aplicação levantar uma exceção antes de responder, conta como 500.
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get('route')
+            # O FastAPI coloca a rota encontrada no scope: usamos o template (/users/{user_id}) e não o caminho real,
+            # assim a quantidade de séries não cresce com cada id.
+            labels = {'method': scope['method'], 'route': getattr(route, 'path', 'unmatched'), 'status': status}
+            HTTP_REQUESTS.inc(**labels)
+            HTTP_LATENCY.observe(perf_counter() - start, **labels)
@@ -1,11 +1,18 @@
-from datetime import datetime
+from datetime import UTC, datetime
 
-from sqlalchemy import func
+from sqlalchemy import Index, func
 from sqlalchemy.orm import Mapped, mapped_column, registry
 
 table_registry = registry()
 
 
+def utcnow():
+    # updated_at com microssegundos: o CURRENT_TIMESTAMP do SQLite só tem segundos e o ETag (id + updated_at)
+    # precisa mudar a cada alteração, mesmo com duas no mesmo segundo. Vale também no INSERT, assim o
+    # GET /users/changes compara cadastros e alterações no mesmo formato.
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
 @table_registry.mapped_as_dataclass
 class User:
     __tablename__ = 'users'
@@ -17,4 +24,50 @@ class User:
     created_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
 
     # Exercício
-    updated_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now(), onupdate=func.now())
+    updated_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now(), insert_default=utcnow, onupdate=utcnow)
+    last_login_at: Mapped[datetime | None] = mapped_column(init=False, default=None)
+    # Gravado em lote pelo LoginAuditWriter (audit.py), alguns instantes depois do login.
+
+
+Index('ix_users_username_lower', func.lower(User.username))
+Index('ix_users_email_lower', func.lower(User.email))
+# Índices funcionais para a busca por prefixo sem diferenciar maiúsculas (GET /users/search):
+# a busca compara lower(coluna) por faixa, então o banco percorre só o pedaço do índice que começa com o prefixo.
+Index('ix_users_updated_at_id', User.updated_at, User.id)
+# GET /users/changes lê só o que mudou depois do watermark (keyset em updated_at, id), sem percorrer a tabela inteira.
+
+
+@table_registry.mapped_as_dataclass
+class UserKey:
+    # Reserva de username/email com sharding: uma linha por chave ('username:...' ou 'email:...'), no shard do hash da chave.
+    # A chave primária garante a unicidade entre todos os shards (a constraint unique de users só vale dentro de um shard).
+    __tablename__ = 'user_keys'
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+
+
+@table_registry.mapped_as_dataclass
+class UserTombstone:
+    # Registro de usuário removido, para o GET /users/changes avisar quem espelha a tabela que a linha sumiu.
+    __tablename__ = 'user_tombstones'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    user_id: Mapped[int]
+    deleted_at: Mapped[datetime] = mapped_column(init=False, insert_default=utcnow)
+
+
+Index('ix_user_tombstones_deleted_at_id', UserTombstone.deleted_at, UserTombstone.id)
+
+
+@table_registry.mapped_as_dataclass
+class LoginEvent:
+    # Trilha de auditoria: uma linha por login bem-sucedido, no mesmo shard do usuário.
+    __tablename__ = 'login_events'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    user_id: Mapped[int]
+    ip: Mapped[str | None]
+    logged_in_at: Mapped[datetime]
+
+
+Index('ix_login_events_user_id_logged_in_at', LoginEvent.user_id, LoginEvent.logged_in_at)
@@ -0,0 +1,55 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+
+def encode_cursor(last_id: int) -> str:
+    # O cursor é opaco para o cliente: só um JSON com o último id da página em base64 (url safe, sem padding).
+    return urlsafe_b64encode(json.dumps({'id': last_id}).encode()).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    # Levanta ValueError para qualquer cursor que não tenha sido gerado por encode_cursor.
+    try:
+        data = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        last_id = data['id']
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+    if not isinstance(last_id, int):
+        raise ValueError('Invalid cursor')
+    return last_id
+
+
+def encode_search_cursor(last_key: str, last_id: int) -> str:
+    # Na busca a ordem é (valor em minúsculas, id), então o cursor carrega os dois.
+    return urlsafe_b64encode(json.dumps({'key': last_key, 'id': last_id}).encode()).rstrip(b'=').decode()
+
+
+def decode_search_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        data = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        last_key, last_id = data['key'], data['id']
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+    if not isinstance(last_key, str) or not isinstance(last_id, int):
+        raise ValueError('Invalid cursor')
+    return last_key, last_id
+
+
+def encode_watermark(at: datetime, kind: int, row_id: int) -> str:
+    # Posição da última mudança entregue por GET /users/changes: (momento, tipo, id) com tipo 0 = usuário, 1 = remoção.
+    return urlsafe_b64encode(json.dumps({'at': at.isoformat(), 'kind': kind, 'id': row_id}).encode()).rstrip(b'=').decode()
+
+
+def decode_watermark(watermark: str) -> tuple[datetime, int, int]:
+    try:
+        data = json.loads(urlsafe_b64decode(watermark + '=' * (-len(watermark) % 4)))
+        at, kind, row_id = datetime.fromisoformat(data['at']), data['kind'], data['id']
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError('Invalid watermark') from exc
+
+    if kind not in {0, 1} or not isinstance(row_id, int):
+        raise ValueError('Invalid watermark')
+    return at, kind, row_id
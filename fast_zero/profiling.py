@@ -0,0 +1,170 @@
+"""Profiling opcional por requisição, para ver onde o tempo de um endpoint é gasto em produção.
+
+Uso: python -m fast_zero.profiling --ttl 300
+     (imprime um valor para o header X-Profile, assinado com PROFILE_SECRET e válido por --ttl segundos)
+"""
+
+import argparse
+import asyncio
+import cProfile
+import hmac
+import logging
+import random
+import sys
+import threading
+from collections import Counter
+from hashlib import sha256
+from pathlib import Path
+from time import perf_counter, time
+
+from fast_zero.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b'x-profile'
+
+
+def sign_profile_header(secret: str, ttl: float = 300) -> str:
+    # Valor do header X-Profile: '<expira_em>.<hmac>'. Só quem tem o PROFILE_SECRET consegue pedir um profile.
+    expires = int(time() + ttl)
+    return f'{expires}.{hmac.new(secret.encode(), str(expires).encode(), sha256).hexdigest()}'
+
+
+def verify_profile_header(secret: str, value: str) -> bool:
+    expires, _, signature = value.partition('.')
+    if not secret or not expires.isdigit():
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), sha256).hexdigest()
+    return hmac.compare_digest(signature, expected) and int(expires) >= time()
+
+
+class SamplingCollector:
+    # Uma thread separada lê a pilha da thread do event loop a cada `interval` segundos e conta as pilhas iguais.
+    # O resultado é o formato "collapsed" (frame;frame;frame contagem) que o flamegraph.pl e o speedscope leem.
+    # Custo baixo para o endpoint: nada é instrumentado, só amostrado.
+    suffix = '.collapsed'
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path: Path):
+        path.write_text(''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common()), encoding='utf-8')
+
+
+class CProfileCollector:
+    # cProfile determinístico: todas as chamadas com tempo acumulado, lido com pstats/snakeviz. Mais caro que a amostragem.
+    suffix = '.pstats'
+
+    def __init__(self, interval: float):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self, path: Path):
+        self.profile.dump_stats(path)
+
+
+COLLECTORS = {'sampling': SamplingCollector, 'cprofile': CProfileCollector}
+
+
+def route_slug(route: str) -> str:
+    # /users/{user_id} => users_user_id, um diretório por template de rota.
+    return route.strip('/').replace('/', '_').replace('{', '').replace('}', '') or 'root'
+
+
+class ProfilingMiddleware:
+    # Profila uma fração das requisições (sample_rate) e as que trazem um header X-Profile assinado.
+    # Os dois coletores veem a thread do event loop inteira: enquanto a requisição espera o banco, o que outras
+    # requisições executarem também aparece. Por isso só uma requisição é profilada por vez (as outras seguem sem profile).
+    # O que roda no threadpool (rotas def e o ThreadedSession do driver síncrono) fica fora: aparece só a espera por ele.
+    def __init__(  # noqa: PLR0913, PLR0917
+        self, app, directory: str, sample_rate: float = 0.0, secret: str = '', mode: str = 'sampling', max_files: int = 50, interval: float = 0.001
+    ):
+        self.app = app
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.collector = COLLECTORS[mode]
+        self.max_files = max_files
+        self.interval = interval
+        self._active = False
+
+    def should_profile(self, scope) -> bool:
+        for name, value in scope['headers']:
+            if name == PROFILE_HEADER:
+                return verify_profile_header(self.secret, value.decode('latin-1'))
+        return random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self._active or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        collector = self.collector(self.interval)
+        start = perf_counter()
+        collector.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            collector.stop()
+            self._active = False
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            try:
+                await asyncio.to_thread(self.dump, collector, route, scope['method'], perf_counter() - start)
+                # Gravar em disco fora do event loop.
+            except OSError:
+                logger.exception('Could not write profile for %s', route)
+
+    def dump(self, collector, route: str, method: str, elapsed: float) -> Path:
+        directory = self.directory / route_slug(route)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{int(time() * 1000)}-{method}-{elapsed * 1000:.0f}ms{collector.suffix}'
+        collector.dump(path)
+
+        files = sorted(directory.iterdir(), key=lambda file: file.name)
+        # O nome começa com o timestamp em ms: ordem alfabética = ordem cronológica.
+        for old in files[: max(len(files) - self.max_files, 0)]:
+            old.unlink(missing_ok=True)
+        # Retenção limitada por rota: só os max_files mais recentes ficam no disco.
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ttl', type=float, default=300)
+    args = parser.parse_args()
+
+    secret = get_settings().PROFILE_SECRET
+    if not secret:
+        sys.exit('PROFILE_SECRET is not set')
+    print(sign_profile_header(secret, args.ttl))
+
+
+if __name__ == '__main__':
+    main()
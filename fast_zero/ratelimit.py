@@ -0,0 +1,61 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+class BucketStorage(ABC):
+    # Interface do armazenamento dos token buckets. A implementação padrão fica em memória (por processo);
+    # para vários workers/instâncias basta implementar consume em um store compartilhado (ex: script Lua no Redis),
+    # desde que a operação seja atômica. Um backend sem algum dos métodos já falha ao ser instanciado (TypeError).
+    @abstractmethod
+    def consume(self, key: str, capacity: float, refill_per_second: float) -> float:
+        # Tenta tirar 1 token do bucket. Retorna 0 se conseguiu, senão quantos segundos faltam para o próximo token.
+        ...
+
+    @abstractmethod
+    def clear(self): ...
+
+
+class MemoryBucketStorage(BucketStorage):
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        # chave -> (tokens, instante da última atualização); os buckets mais antigos saem primeiro quando enche
+        self._lock = Lock()
+
+    def consume(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+            # Repõe os tokens proporcionalmente ao tempo desde o último acesso.
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / refill_per_second
+
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class TokenBucketLimiter:
+    def __init__(self, name: str, capacity: int, per_minute: float, storage: BucketStorage | None = None):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = per_minute / 60
+        self.storage = storage or MemoryBucketStorage()
+        self.rejected = 0
+
+    def hit(self, key: str) -> float:
+        retry_after = self.storage.consume(f'{self.name}:{key}', self.capacity, self.refill_per_second)
+        if retry_after:
+            self.rejected += 1
+        return retry_after
@@ -1,45 +1,56 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 
 # Importações para SQLAlchemy
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import update
 
-from fast_zero.database import get_session
 from fast_zero.models import User
 from fast_zero.schemas import Token
-from fast_zero.security import create_access_token, verify_password
+from fast_zero.security import Hasher, PrincipalCache, check_login_rate_limit, create_access_token, verify_and_update_password_async
+from fast_zero.sharding import Shards, find_user_by_email, get_shards
 
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
 
-Session = Annotated[Session, Depends(get_session)]
+ShardSessions = Annotated[Shards, Depends(get_shards)]
 OAuth2Form = Annotated[OAuth2PasswordRequestForm, Depends()]
 
 
 @router.post('/token', response_model=Token)
 # Endpoint para autenticação e geração de token de acesso. Retorna o token de acesso. no modelo de resposta Token
-def login_for_acess_token(form_data: OAuth2Form, session: Session):
+async def login_for_acess_token(request: Request, form_data: OAuth2Form, shards: ShardSessions, hasher: Hasher, principal_cache: PrincipalCache):
     # OAuth2PasswordRequestForm => Formulário de dados enviado pelo cliente para autenticação.
     # Ele espera receber os campos username e password no corpo da requisição.
-    user = session.scalar(select(User).where(User.email == form_data.username))
-    # Busca o usuário no banco de dados com base no email fornecido no formulário.
+    check_login_rate_limit(request, form_data.username)
+    # Limite de tentativas por IP e por conta, antes de consultar o banco ou calcular o hash.
+    user = await find_user_by_email(shards, form_data.username)
+    # Busca o usuário no banco de dados com base no email fornecido no formulário (no shard do hash do email).
     if not user:
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
             detail='Incorrect username or password',
         )
     # caso envie um token diferente do JWT
-    if not verify_password(form_data.password, user.password):
+    valid, updated_hash = await verify_and_update_password_async(hasher, form_data.password, user.password)
+    if not valid:
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
             detail='Incorrect username or password',
         )
-    access_token = create_access_token(data={'sub': user.email})
+    if updated_hash:
+        # O hash salvo foi gerado com parâmetros antigos do Argon2: aproveita a senha em texto puro deste login
+        # para migrar para os parâmetros atuais, sem precisar de um rehash em massa.
+        session = shards.for_id(user.id)
+        await session.execute(update(User).where(User.id == user.id).values(password=updated_hash))
+        await session.commit()
+        principal_cache.pop(user.email)
+    request.app.state.login_audit.record(user.id, request.client.host if request.client else None)
+    # last_login_at e login_events são gravados depois, em lote, pelo LoginAuditWriter: o login não abre transação de escrita.
+    access_token = create_access_token(data={'sub': user.email}, settings=request.app.state.settings)
     # Cria um token de acesso JWT com o email do usuário como assunto (sub).
     return {'access_token': access_token, 'token_type': 'Bearer'}
 
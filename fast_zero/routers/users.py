@@ -1,25 +1,67 @@
+import csv
+import heapq
+import io
+import json
+from datetime import timedelta
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import TypeAdapter
 
 # Importações para SQLAlchemy
-from sqlalchemy import select
+from sqlalchemy import func, select, tuple_, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
 
-from fast_zero.database import get_session
-from fast_zero.models import User
-from fast_zero.schemas import FilterPage, Message, UserList, UserPublic, UserSchema
-from fast_zero.security import get_current_user, get_password_hash
+from fast_zero.coalescing import coalescing_key
+from fast_zero.database import ReplicaRouter, get_replicas, stream_rows
+from fast_zero.etag import cache_headers, etag_matches, make_etag, not_modified
+from fast_zero.models import User, UserTombstone, utcnow
+from fast_zero.pagination import decode_cursor, decode_search_cursor, decode_watermark, encode_cursor, encode_search_cursor, encode_watermark
+from fast_zero.schemas import (
+    ChangesQuery,
+    FilterPage,
+    Message,
+    UserBulk,
+    UserBulkResult,
+    UserChanges,
+    UserList,
+    UserListPage,
+    UserPublic,
+    UserRow,
+    UserSchema,
+    UserSearch,
+    UserUpdate,
+)
+from fast_zero.security import Hasher, PrincipalCache, get_current_user, get_password_hash_async, get_password_hashes_async
+from fast_zero.sharding import (
+    Shards,
+    claim_keys,
+    fetch_merged,
+    get_read_shards,
+    get_shards,
+    insert_users,
+    merge_sorted,
+    next_id,
+    release_keys,
+    taken_keys,
+    user_keys,
+)
 
 router = APIRouter(prefix='/users', tags=['users'])
-Session = Annotated[Session, Depends(get_session)]
+ShardSessions = Annotated[Shards, Depends(get_shards)]
+ReadShards = Annotated[Shards, Depends(get_read_shards)]
+# ReadShards => endpoints só de leitura, o shard 0 pode ser atendido por uma réplica.
 CurrentUser = Annotated[User, Depends(get_current_user)]
+Replicas = Annotated[ReplicaRouter, Depends(get_replicas)]
+user_list_adapter = TypeAdapter(UserListPage)
+user_row_adapter = TypeAdapter(UserRow)
+# TypeAdapter é montado uma única vez no import e reaproveitado em todas as requisições.
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
-def create_user(user: UserSchema, session: Session):
+async def create_user(user: UserSchema, shards: ShardSessions, hasher: Hasher, replicas: Replicas):
     # Usando dependência para obter a sessão de banco de dados após usar ele encerra conexão com o banco.
     # engine = create_engine(Settings().DATABASE_URL)
     # # Cria a engine de conexão com o banco de dados usando a URL do banco de dados das configurações.
@@ -31,42 +73,299 @@ def create_user(user: UserSchema, session: Session):
     # Porém essa forma de chamar a função não é a ideal, pois a cada requisição uma nova conexão com o banco de dados será criada
     # e não será fechada, o ideal é usar a injeção de dependência
 
-    db_user = session.scalar(
+    session = shards.for_email(user.email)
+    # Com sharding o usuário novo vai para o shard do hash do email; sem sharding é a sessão de sempre.
+
+    db_user = await session.scalar(
         select(User).where((User.username == user.username) | (User.email == user.email))
     )  # Seleciona o usuário do banco de dados com o ID fornecido.
     # o Scalar vai retornar o primeiro resultado ou None ou se encontrou um resultado, somente um resultado, se for mais de um serai scalars
     if db_user:
         raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Username or email already exists')
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(hasher, user.password)
     # encriptografa a senha e salva no banco
-    db_user = User(username=user.username, password=hashed_password, email=user.email)
-    # Cria um novo objeto User com os dados fornecidos.
+    # o Argon2 é pesado para a CPU, por isso roda no pool de processos do hasher e não trava o event loop
+    keys = user_keys(user.username, user.email)
+    try:
+        await claim_keys(shards, keys)
+        # A consulta acima só enxerga um shard: a reserva em user_keys garante a unicidade em todos.
+    except IntegrityError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Username or email already exists')
+
+    for attempt in range(2):
+        db_user = User(username=user.username, password=hashed_password, email=user.email)
+        # Cria um novo objeto User com os dados fornecidos.
+        if shards.sharded:
+            db_user.id = next_id(shards.index_for_email(user.email))
+            # Id global gerado no próprio INSERT: id % SHARD_ID_STRIDE é o shard do usuário.
 
-    session.add(db_user)  # Adiciona o objeto User à sessão de banco de dados.
-    session.commit()  # Salva as alterações no banco de dados.
-    session.refresh(db_user)  # Atualiza o objeto User com os dados do banco de dados, incluindo o ID gerado automaticamente.
+        session.add(db_user)  # Adiciona o objeto User à sessão de banco de dados.
+        try:
+            await session.commit()  # Salva as alterações no banco de dados.
+            break
+        except IntegrityError:
+            await session.rollback()
+            if shards.sharded and not attempt:
+                continue
+                # username/email já estão reservados em user_keys: o conflito só pode ser o id, calculado ao mesmo tempo
+                # por outro cadastro no mesmo shard. Tenta de novo com um id novo (como o insert_users).
+            await release_keys(shards, keys)
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Username or email already exists')
+    await session.refresh(db_user)  # Atualiza o objeto User com os dados do banco de dados, incluindo o ID gerado automaticamente.
+    replicas.mark_write(db_user.email)
+    # O primeiro login/leitura do novo usuário vai para o primário, a réplica pode ainda não ter a linha.
 
     return db_user  # Retorna o objeto User atualizado.
 
 
+async def _bulk_conflicts(shards: Shards, users: list[UserSchema]):
+    # Uma única consulta (por shard) para descobrir quais usernames/emails do lote já existem no banco.
+    taken = await taken_keys(shards, {user.username for user in users}, {user.email for user in users})
+
+    conflicts = set()
+    for index, user in enumerate(users):
+        if user.username in taken or user.email in taken:
+            conflicts.add(index)
+        taken.update((user.username, user.email))
+        # Duplicados dentro do próprio lote: o primeiro ganha, os seguintes viram conflito.
+    return conflicts
+
+
+@router.post('/bulk', response_model=UserBulkResult)
+async def create_users_bulk(bulk: UserBulk, shards: ShardSessions, current_user: CurrentUser, hasher: Hasher, replicas: Replicas):
+    # Criação em lote: verificação de duplicados, hash e INSERT feitos para o lote inteiro de uma vez,
+    # em vez de um SELECT + hash + INSERT + commit + refresh por usuário como no create_user.
+    conflicts = await _bulk_conflicts(shards, bulk.users)
+    pending = [index for index in range(len(bulk.users)) if index not in conflicts]
+    hashed_passwords = dict(zip(pending, await get_password_hashes_async(hasher, [bulk.users[index].password for index in pending])))
+    # os hashes são calculados em paralelo, em pedaços distribuídos entre os workers do hasher
+
+    subject = current_user.email
+    # Guardado antes do loop: o rollback expira o current_user.
+    created = {}
+    for attempt in range(2):
+        pending = [index for index in pending if index not in conflicts]
+        if not pending:
+            break
+        try:
+            rows = await insert_users(
+                shards,
+                [
+                    {'username': bulk.users[index].username, 'email': bulk.users[index].email, 'password': hashed_passwords[index]}
+                    for index in pending
+                ],
+            )
+            # executemany com RETURNING: o SQLAlchemy agrupa as linhas em poucos INSERTs e devolve os ids na ordem enviada.
+            # Com sharding é um INSERT em lote por shard.
+            created = dict(zip(pending, rows))
+            replicas.mark_write(subject)
+            break
+        except IntegrityError:
+            if attempt:
+                raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Username or email already exists')
+            conflicts = await _bulk_conflicts(shards, bulk.users)
+            # Outra requisição inseriu algum desses usuários entre a verificação e o INSERT: verifica de novo e tenta só os restantes.
+
+    return {
+        'results': [
+            {'index': index, 'status': 'created', 'user': created[index]._asdict()} if index in created else {'index': index, 'status': 'conflict'}
+            for index in range(len(bulk.users))
+        ]
+    }
+
+
 @router.get('/', response_model=UserList)
-def read_users(session: Session, current_user: CurrentUser, filter_users: Annotated[FilterPage, Query()]):
+async def read_users(request: Request, shards: ReadShards, current_user: CurrentUser, filter_users: Annotated[FilterPage, Query()]):
     # filter_users-> paginação para limitar a quantidade de registros retornados e pular os primeiros registros
     # Usando dependência para obter o usuário atual autenticado. tem que ter um usuário autenticado para acessar esse endpoint
     # Usando dependência para obter a sessão de banco de dados.
-    users = session.scalars(select(User).offset(filter_users.offset).limit(filter_users.limit)).all()
+    where = []
+    offset = 0
+    if filter_users.cursor:
+        where.append(User.id > decode_cursor(filter_users.cursor))
+        # Keyset: usa o índice da chave primária para pular direto para a página, sem ler as linhas anteriores.
+    else:
+        offset = filter_users.offset
+        # offset => pula os primeiros registros (cada página mais funda lê e descarta todas as anteriores)
+
+    if request.headers.get('If-None-Match'):
+        versions = await fetch_merged(shards, select(User.id, User.updated_at).where(*where).order_by(User.id), filter_users.limit + 1, offset)
+        # Consulta leve (só id e updated_at) para decidir o 304 antes de buscar e serializar a página inteira.
+        etag = make_etag(*versions)
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+
+    async def load_page():
+        query = select(User.id, User.username, User.email, User.updated_at).where(*where).order_by(User.id)
+        # Seleciona só as colunas de UserPublic (e o updated_at para o ETag) como linhas do Core: sem identity map e sem hash de senha.
+        users = await fetch_merged(shards, query, filter_users.limit + 1, offset)
+        etag = make_etag(*((user.id, user.updated_at) for user in users))
+        # O ETag cobre as limit + 1 linhas lidas, então também muda quando a existência da próxima página muda.
+
+        # limit + 1 => busca um registro a mais só para saber se existe uma próxima página
+        next_cursor = None
+        if len(users) > filter_users.limit:
+            users = users[: filter_users.limit]
+            next_cursor = encode_cursor(users[-1].id) if users else None
+
+        return user_list_adapter.dump_json({'users': [user._asdict() for user in users], 'next_cursor': next_cursor}), etag
+
+    body, etag = await request.app.state.read_flight.do(coalescing_key(request), load_page)
+    # Requisições iguais ao mesmo tempo (pico de GET /users?offset=0) fazem uma consulta e uma serialização só.
+    return Response(body, media_type='application/json', headers=cache_headers(request, etag))
+    # Devolve o JSON já serializado, o FastAPI não passa o resultado de novo pelo UserList (response_model fica só para a documentação).
+
+
+@router.get('/export')
+async def export_users(
+    shards: ReadShards,
+    current_user: CurrentUser,
+    export_format: Annotated[Literal['ndjson', 'csv'], Query(alias='format')] = 'ndjson',
+):
+    # Exporta todos os usuários em uma única resposta em streaming, em vez de paginar GET /users.
+    fields = list(UserPublic.model_fields)
+    # Seleciona só as colunas de UserPublic: o hash da senha nunca é carregado.
+    query = select(*(getattr(User, field) for field in fields)).order_by(User.id)
+    if shards.sharded:
+        rows = merge_sorted([stream_rows(session.bind, query) for session in shards.sessions], key=lambda row: row.id)
+        # Um stream por shard, todos ordenados por id, juntos em um único stream ordenado.
+    else:
+        rows = stream_rows(shards.sessions[0].bind, query)
+
+    async def ndjson():
+        async for partition in rows:
+            yield ''.join(json.dumps(row._asdict()) + '\n' for row in partition)
+
+    async def csv_lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        async for partition in rows:
+            writer.writerows(partition)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            # Reaproveita o mesmo buffer a cada lote, a memória não cresce com o tamanho da tabela.
+        yield buffer.getvalue()
+
+    if export_format == 'csv':
+        return StreamingResponse(csv_lines(), media_type='text/csv', headers={'Content-Disposition': 'attachment; filename="users.csv"'})
+    return StreamingResponse(ndjson(), media_type='application/x-ndjson')
+
+
+def user_search_query(field: str, prefix: str, after: tuple[str, int] | None = None):
+    # Busca por prefixo como faixa no índice funcional: lower(coluna) >= 'ab' AND lower(coluna) < 'ac'.
+    # Ao contrário de LIKE 'ab%' (que o SQLite só otimiza em coluna simples, não em lower(...)), a faixa usa o índice em qualquer banco.
+    key = func.lower(getattr(User, field))
+    prefix = prefix.lower()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    query = (
+        select(User.id, User.username, User.email, key.label('key')).where(key >= prefix, key < upper).order_by(key, User.id)
+        # Ordem (valor, id) é a própria ordem do índice: sem etapa de ordenação e com keyset estável mesmo com valores repetidos.
+    )
+    if after is not None:
+        query = query.where(tuple_(key, User.id) > tuple_(*after))
+    return query
+
+
+@router.get('/search', response_model=UserList)
+async def search_users(request: Request, shards: ReadShards, current_user: CurrentUser, search: Annotated[UserSearch, Query()]):
+    # Busca por prefixo em username ou email, sem diferenciar maiúsculas, paginada por keyset.
+    after = decode_search_cursor(search.cursor) if search.cursor else None
+
+    async def load_page():
+        rows = await fetch_merged(shards, user_search_query(search.field, search.q, after), search.limit + 1, key=lambda row: (row.key, row.id))
+
+        next_cursor = None
+        if len(rows) > search.limit:
+            rows = rows[: search.limit]
+            next_cursor = encode_search_cursor(rows[-1].key, rows[-1].id)
+
+        return user_list_adapter.dump_json({
+            'users': [{'id': row.id, 'username': row.username, 'email': row.email} for row in rows],
+            'next_cursor': next_cursor,
+        })
+
+    return Response(await request.app.state.read_flight.do(coalescing_key(request), load_page), media_type='application/json')
+
+
+@router.get('/changes', response_model=UserChanges)
+async def read_changes(request: Request, shards: ReadShards, current_user: CurrentUser, changes: Annotated[ChangesQuery, Query()]):
+    # Sincronização incremental: usuários criados/alterados e remoções (tombstones) depois do watermark, em ordem de acontecimento.
+    # Cada consulta é um keyset no índice (updated_at, id) / (deleted_at, id): o custo acompanha o número de mudanças, não o tamanho da tabela.
+    horizon = utcnow() - timedelta(seconds=request.app.state.settings.SYNC_SETTLE_SECONDS)
+    upserts = select(User.id, User.username, User.email, User.updated_at.label('at')).where(User.updated_at < horizon)
+    upserts = upserts.order_by(User.updated_at, User.id)
+    deletes = select(UserTombstone.id, UserTombstone.user_id, UserTombstone.deleted_at.label('at')).where(UserTombstone.deleted_at < horizon)
+    deletes = deletes.order_by(UserTombstone.deleted_at, UserTombstone.id)
+    if changes.since:
+        at, kind, row_id = decode_watermark(changes.since)
+        # Ordem global (momento, tipo, id): no mesmo instante os upserts (0) vêm antes das remoções (1).
+        upserts = upserts.where(tuple_(User.updated_at, User.id) > tuple_(at, row_id) if kind == 0 else User.updated_at > at)
+        deletes = deletes.where(
+            tuple_(UserTombstone.deleted_at, UserTombstone.id) > tuple_(at, row_id) if kind == 1 else UserTombstone.deleted_at >= at
+        )
 
-    # Usa a sessão de banco de dados para selecionar todos os usuários.
-    # session.scalars => Retorna todos os resultados como uma lista de objetos User.
-    # limit => limita a quantidade de registros retornados
-    # offset => pula os primeiros registros
-    return {'users': users}
+    upsert_rows = await fetch_merged(shards, upserts, changes.limit + 1, key=lambda row: (row.at, row.id))
+    delete_rows = await fetch_merged(shards, deletes, changes.limit + 1, key=lambda row: (row.at, row.id))
+    events = list(
+        heapq.merge(((row.at, 0, row.id, row) for row in upsert_rows), ((row.at, 1, row.id, row) for row in delete_rows), key=lambda event: event[:3])
+    )
+
+    has_more = len(events) > changes.limit
+    events = events[: changes.limit]
+    return {
+        'changes': [
+            {'op': 'upsert', 'id': row.id, 'at': at, 'user': {'id': row.id, 'username': row.username, 'email': row.email}}
+            if kind == 0
+            else {'op': 'delete', 'id': row.user_id, 'at': at}
+            for at, kind, _, row in events
+        ],
+        'watermark': encode_watermark(*events[-1][:3]) if events else changes.since,
+        # Sem mudanças novas o watermark continua o mesmo.
+        'has_more': has_more,
+    }
+
+
+@router.get('/{user_id}', response_model=UserPublic)
+async def read_user(user_id: int, request: Request, shards: ReadShards, current_user: CurrentUser):
+    not_found = HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='User not found')
+    session = shards.for_id(user_id)
+    if session is None:
+        raise not_found
+
+    if request.headers.get('If-None-Match'):
+        updated_at = await session.scalar(select(User.updated_at).where(User.id == user_id))
+        # Só o updated_at: se o cliente já tem a versão atual responde 304 sem ler nem serializar o resto.
+        if updated_at is None:
+            raise not_found
+        etag = make_etag((user_id, updated_at))
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+
+    user = (await session.execute(select(User.id, User.username, User.email, User.updated_at).where(User.id == user_id))).one_or_none()
+    if user is None:
+        raise not_found
+
+    return Response(
+        user_row_adapter.dump_json(user._asdict()),
+        media_type='application/json',
+        headers=cache_headers(request, make_etag((user.id, user.updated_at))),
+    )
 
 
 @router.put('/{user_id}', response_model=UserPublic)
 # Atualiza um usuário existente com base no ID fornecido. Retorna o usuário atualizado.
-def update_user(user_id: int, user: UserSchema, session: Session, current_user: CurrentUser):
+async def update_user(  # noqa: PLR0913, PLR0917
+    user_id: int,
+    user: UserSchema,
+    shards: ShardSessions,
+    current_user: CurrentUser,
+    hasher: Hasher,
+    replicas: Replicas,
+    principal_cache: PrincipalCache,
+):
     # Agora com o current_user não sera preciso comparar o usuário, pois a propria funçao ja faz essa validação
     # Usando dependência para obter a sessão de banco de dados.
     # user_id é o ID do usuário a ser atualizado.
@@ -75,37 +374,129 @@ def update_user(user_id: int, user: UserSchema, session: Session, current_user:
     if current_user.id != user_id:
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Not enough permission')
 
+    hashed_password = await get_password_hash_async(hasher, user.password)
+    # Hash antes de reservar as chaves: um 503 da fila de hashing não deixa username/email presos em user_keys.
+
+    session = shards.for_id(user_id)
+    principal_cache.pop(current_user.email)
+    # Remove o usuário do cache de autenticação para que o novo email/senha valham imediatamente.
+    # De novo depois do commit: uma requisição autenticada no meio da escrita pode ter lido a linha antiga e voltado ela ao cache.
+    old_email = current_user.email
+    old_keys = user_keys(current_user.username, current_user.email)
+    new_keys = [key for key in user_keys(user.username, user.email) if key not in old_keys]
+
+    try:
+        await claim_keys(shards, new_keys)
+    except IntegrityError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Username or email already exists')
+
     try:
         current_user.username = user.username
         current_user.email = user.email
-        current_user.password = get_password_hash(user.password)
+        current_user.password = hashed_password
         # Atualiza os campos do usuário com os dados fornecidos, incluindo o hash da nova senha.
 
         session.add(current_user)
-        session.commit()
-        session.refresh(current_user)
+        await session.commit()
+    except Exception as error:
+        await session.rollback()
+        await release_keys(shards, new_keys)
+        # Qualquer falha antes do commit devolve as chaves reservadas, não só o conflito.
+        if isinstance(error, IntegrityError):
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Username or email already exists')
+        raise
+
+    replicas.mark_write(old_email, user.email)
+    principal_cache.pop(old_email)
+    # mark_write antes do pop: quem autenticar com o token antigo depois daqui lê do primário, não de uma réplica atrasada
+    # que devolveria a linha antiga ao cache por todo o TTL.
+    await session.refresh(current_user)
+    await release_keys(shards, [key for key in old_keys if key not in user_keys(user.username, user.email)])
+
+    return current_user
 
+
+@router.patch('/{user_id}', response_model=UserPublic)
+async def patch_user(  # noqa: PLR0913, PLR0917
+    user_id: int,
+    user: UserUpdate,
+    shards: ShardSessions,
+    current_user: CurrentUser,
+    hasher: Hasher,
+    replicas: Replicas,
+    principal_cache: PrincipalCache,
+):
+    # Atualização parcial: só os campos enviados, em um único UPDATE ... RETURNING (sem SELECT antes nem refresh depois).
+    if current_user.id != user_id:
+        raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Not enough permission')
+
+    values = user.model_dump(exclude_none=True)
+    if not values:
         return current_user
 
+    if 'password' in values:
+        values['password'] = await get_password_hash_async(hasher, values['password'])
+        # Só gera um novo hash (Argon2) quando uma nova senha foi enviada.
+
+    session = shards.for_id(user_id)
+    subject = current_user.email
+    principal_cache.pop(subject)
+    old_keys = user_keys(current_user.username, current_user.email)
+    new_keys = [key for key in user_keys(values.get('username'), values.get('email')) if key not in old_keys]
+
+    try:
+        await claim_keys(shards, new_keys)
+        # Só o username/email que mudou precisa ser reservado (no-op sem sharding).
+    except IntegrityError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Username or email already exists')
+
+    try:
+        updated = await session.execute(update(User).where(User.id == user_id).values(**values).returning(User.id, User.username, User.email))
+        user_public = updated.one()._asdict()
+        await session.commit()
+        principal_cache.pop(subject)
+        # Depois do commit também: o pop de antes não cobre quem autenticou durante o hash/UPDATE.
+        replicas.mark_write(subject, user_public['email'])
     except IntegrityError:
+        await session.rollback()
+        await release_keys(shards, new_keys)
         raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Username or email already exists')
 
+    await release_keys(shards, [key for key in old_keys if key not in user_keys(user_public['username'], user_public['email'])])
+
+    return user_public
+
 
 @router.delete('/{user_id}', response_model=Message)
-def delete_user(
+async def delete_user(
     user_id: int,
-    session: Session,
+    shards: ShardSessions,
     current_user: CurrentUser,
+    replicas: Replicas,
+    principal_cache: PrincipalCache,
 ):
     # passando o currente user, não sera mais necessário buscar o usuario no bano
     # user_db = session.scalar(select(User).where(User.id == user_id))
 
     # if not user_db:
-    #    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='User not found')    
+    #    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='User not found')
     if current_user.id != user_id:
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Not enough permission')
 
-    session.delete(current_user)
-    session.commit()
+    session = shards.for_id(user_id)
+    subject = current_user.email
+    keys = user_keys(current_user.username, current_user.email)
+    principal_cache.pop(subject)
+    # Um usuário removido não pode continuar autenticado pelo cache.
+
+    await session.delete(current_user)
+    session.add(UserTombstone(user_id=user_id))
+    # Tombstone na mesma transação da remoção, para o GET /users/changes avisar quem sincroniza.
+    await session.commit()
+    principal_cache.pop(subject)
+    # E depois do commit: quem autenticou enquanto a remoção rodava pode ter colocado o usuário de volta no cache.
+    replicas.mark_write(subject)
+    await release_keys(shards, keys)
+    # Libera o username/email para novos cadastros (no-op sem sharding).
 
     return {'message': 'User deleted successfully'}
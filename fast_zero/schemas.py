@@ -1,4 +1,10 @@
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+from typing_extensions import TypedDict
+
+from fast_zero.pagination import decode_cursor, decode_search_cursor, decode_watermark
 
 
 class Message(BaseModel):
@@ -11,6 +17,13 @@ class UserSchema(BaseModel):
     password: str
 
 
+class UserUpdate(BaseModel):
+    # PATCH: todos os campos são opcionais, só os enviados são alterados.
+    username: str | None = None
+    email: EmailStr | None = None
+    password: str | None = None
+
+
 class UserPublic(BaseModel):
     id: int
     username: str
@@ -20,12 +33,41 @@ class UserPublic(BaseModel):
     # from_attributes=True => Permite que o Pydantic crie o modelo a partir de atributos de um objeto, como um modelo ORM.
 
 
+class UserBulk(BaseModel):
+    users: list[UserSchema] = Field(min_length=1, max_length=1000)
+
+
+class UserBulkItem(BaseModel):
+    index: int
+    # posição do usuário na lista enviada
+    status: Literal['created', 'conflict']
+    user: UserPublic | None = None
+
+
+class UserBulkResult(BaseModel):
+    results: list[UserBulkItem]
+
+
 class UserDB(UserSchema):
     id: int
 
 
 class UserList(BaseModel):
     users: list[UserPublic]
+    next_cursor: str | None = None
+    # Cursor para buscar a próxima página (None quando não há mais registros).
+
+
+class UserRow(TypedDict):
+    # Mesmos campos de UserPublic, mas como TypedDict: serializa linhas do Core direto, sem objetos ORM nem validação.
+    id: int
+    username: str
+    email: str
+
+
+class UserListPage(TypedDict):
+    users: list[UserRow]
+    next_cursor: str | None
 
 
 class Token(BaseModel):
@@ -36,3 +78,57 @@ class Token(BaseModel):
 class FilterPage(BaseModel):
     offset: int = Field(ge=0, default=0)
     limit: int = Field(ge=0, default=10)
+    cursor: str | None = None
+    # Quando informado, a paginação é por keyset (WHERE id > último id) e o offset é ignorado.
+
+    @field_validator('cursor')
+    @classmethod
+    def validate_cursor(cls, cursor):
+        if cursor is not None:
+            decode_cursor(cursor)
+        return cursor
+
+
+class UserSearch(BaseModel):
+    q: str = Field(min_length=1, max_length=100)
+    # Prefixo buscado, sem diferenciar maiúsculas de minúsculas.
+    field: Literal['username', 'email'] = 'username'
+    limit: int = Field(ge=1, le=100, default=10)
+    cursor: str | None = None
+
+    @field_validator('cursor')
+    @classmethod
+    def validate_cursor(cls, cursor):
+        if cursor is not None:
+            decode_search_cursor(cursor)
+        return cursor
+
+
+class ChangesQuery(BaseModel):
+    since: str | None = None
+    # Watermark devolvido pela chamada anterior; sem ele a sincronização começa do início.
+    limit: int = Field(ge=1, le=1000, default=100)
+
+    @field_validator('since')
+    @classmethod
+    def validate_since(cls, since):
+        if since is not None:
+            decode_watermark(since)
+        return since
+
+
+class UserChange(BaseModel):
+    op: Literal['upsert', 'delete']
+    id: int
+    # id do usuário alterado ou removido
+    at: datetime
+    user: UserPublic | None = None
+    # só nas operações upsert
+
+
+class UserChanges(BaseModel):
+    changes: list[UserChange]
+    # Em ordem de acontecimento: aplicar na ordem recebida.
+    watermark: str | None
+    # Enviar como ?since= na próxima chamada. None só quando ainda não existe nenhuma mudança.
+    has_more: bool
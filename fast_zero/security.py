@@ -1,34 +1,128 @@
+import math
 from datetime import datetime, timedelta
+from functools import lru_cache
 from http import HTTPStatus
+from typing import Annotated
 from zoneinfo import ZoneInfo
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 from jwt import DecodeError, decode, encode
-from pwdlib import PasswordHash
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import make_transient_to_detached
 
-from fast_zero.database import get_session
+from fast_zero.cache import TTLCache
+from fast_zero.hashing import HashingQueueFull, PasswordHasher, build_password_hash
+from fast_zero.metrics import REGISTRY, Counter
 from fast_zero.models import User
-from fast_zero.settings import Settings
+from fast_zero.ratelimit import BucketStorage, TokenBucketLimiter
+from fast_zero.settings import Settings, get_settings
+from fast_zero.sharding import Shards, find_user_by_email, get_read_shards, get_shards
 
-pwd_context = PasswordHash.recommended()
-settings = Settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
+LOGIN_REJECTED = REGISTRY.register(Counter('fast_zero_login_rejected_total', 'Login attempts rejected by the rate limiter.', ['scope']))
+
+
+def argon2_params(settings: Settings) -> dict:
+    return {
+        'time_cost': settings.ARGON2_TIME_COST,
+        'memory_cost': settings.ARGON2_MEMORY_COST,
+        'parallelism': settings.ARGON2_PARALLELISM,
+    }
+
+
+@lru_cache
+def password_context():
+    # PasswordHash síncrono (fixtures e scripts), montado no primeiro uso com os parâmetros do Argon2 configurados.
+    return build_password_hash(**argon2_params(get_settings()))
+
+
+def build_hasher(settings: Settings) -> PasswordHasher:
+    return PasswordHasher(workers=settings.HASHING_WORKERS, queue_depth=settings.HASHING_QUEUE_DEPTH, argon2_params=argon2_params(settings))
+
+
+def build_principal_cache(settings: Settings) -> TTLCache:
+    # Cache dos usuários autenticados, indexado pelo sub (email) do token.
+    # Guarda só os valores das colunas, nunca o objeto ORM preso a uma sessão.
+    return TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=min(settings.PRINCIPAL_CACHE_TTL_SECONDS, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60))
+
+
+def build_login_limiters(settings: Settings, storage: BucketStorage) -> list[TokenBucketLimiter]:
+    # Troque o storage por um BucketStorage compartilhado para limitar entre vários workers/instâncias.
+    return [
+        TokenBucketLimiter('ip', settings.LOGIN_RATE_IP_CAPACITY, settings.LOGIN_RATE_IP_PER_MINUTE, storage),
+        TokenBucketLimiter('account', settings.LOGIN_RATE_ACCOUNT_CAPACITY, settings.LOGIN_RATE_ACCOUNT_PER_MINUTE, storage),
+    ]
+
+
+def get_hasher(request: Request) -> PasswordHasher:
+    return request.app.state.hasher
+
+
+def get_principal_cache(request: Request) -> TTLCache:
+    return request.app.state.principal_cache
+
+
+Hasher = Annotated[PasswordHasher, Depends(get_hasher)]
+PrincipalCache = Annotated[TTLCache, Depends(get_principal_cache)]
+
+
+def check_login_rate_limit(request: Request, username: str):
+    # Roda antes de qualquer SELECT ou Argon2: uma rajada de tentativas (credential stuffing)
+    # é recusada sem gastar CPU. Primeiro o limite por IP, depois o por conta.
+    client_ip = request.client.host if request.client else 'unknown'
+    ip_limiter, account_limiter = request.app.state.login_limiters
+    for limiter, key in ((ip_limiter, client_ip), (account_limiter, username.lower())):
+        retry_after = limiter.hit(key)
+        if retry_after:
+            LOGIN_REJECTED.inc(scope=limiter.name)
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS,
+                detail='Too many login attempts, try again later',
+                headers={'Retry-After': str(math.ceil(retry_after))},
+            )
 
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
     # Verifica se a senha em texto simples corresponde ao hash armazenado.
 
 
-def create_access_token(data: dict):
+def _hashing_busy():
+    return HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail='Server is busy, try again later', headers={'Retry-After': '1'})
+
+
+async def get_password_hash_async(hasher: PasswordHasher, password: str):
+    # Versão para os endpoints async: o hash roda no pool de processos do hasher.
+    # Se a fila do pool estiver cheia responde 503 em vez de acumular requisições.
+    try:
+        return await hasher.hash(password)
+    except HashingQueueFull:
+        raise _hashing_busy()
+
+
+async def get_password_hashes_async(hasher: PasswordHasher, passwords: list[str]):
+    try:
+        return await hasher.hash_many(passwords)
+    except HashingQueueFull:
+        raise _hashing_busy()
+
+
+async def verify_and_update_password_async(hasher: PasswordHasher, plain_password: str, hashed_password: str):
+    # Retorna (senha_valida, novo_hash). novo_hash só vem preenchido quando o hash salvo usa parâmetros antigos do Argon2.
+    try:
+        return await hasher.verify_and_update(plain_password, hashed_password)
+    except HashingQueueFull:
+        raise _hashing_busy()
+
+
+def create_access_token(data: dict, settings: Settings | None = None):
     # Função para criar um token de acesso JWT.
+    settings = settings or get_settings()
+    # Dentro do app usa o Settings do próprio app; scripts e testes usam o Settings do processo.
     to_encode = data.copy()
     # Copia os dados fornecidos para evitar modificar o original.
     expire = datetime.now(tz=ZoneInfo('UTC')) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -41,8 +135,23 @@ def create_access_token(data: dict):
     # Retorna o token JWT gerado.
 
 
-def get_current_user(
-    session: Session = Depends(get_session),
+def _principal_snapshot(user: User):
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+
+def _principal_from_snapshot(snapshot: dict):
+    user = User(username=snapshot['username'], email=snapshot['email'], password=snapshot['password'])
+    for key, value in snapshot.items():
+        setattr(user, key, value)
+    make_transient_to_detached(user)
+    # Transforma o objeto em "detached", como se tivesse acabado de ser carregado do banco.
+    return user
+
+
+async def get_current_user(
+    request: Request,
+    shards: Shards = Depends(get_shards),
+    read_shards: Shards = Depends(get_read_shards),
     token: str = Depends(oauth2_scheme),
 ):
     credentials_exception = HTTPException(
@@ -52,6 +161,7 @@ def get_current_user(
     # Usa dependência para obter a sessão de banco de dados e o token OAuth2.
     # headers={'WWW-Authenticate': 'Bearer'} => informa ao cliente que ele deve usar o esquema de autenticação Bearer.
     try:
+        settings = request.app.state.settings
         payload = decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         # Decodifica o token JWT usando a chave secreta e o algoritmo especificado enviado.
         # Se o token for inválido ou expirado, uma exceção DecodeError será levantada.
@@ -63,11 +173,26 @@ def get_current_user(
     except DecodeError:
         raise credentials_exception
 
-    user = session.scalar(select(User).where(User.email == subject_email))
+    principal_cache = get_principal_cache(request)
+    cached = principal_cache.get(subject_email)
+    if cached:
+        return await shards.for_id(cached['id']).merge(_principal_from_snapshot(cached), load=False)
+        # merge com load=False anexa o usuário do cache à sessão sem nenhum SELECT,
+        # assim update_user e delete_user continuam funcionando com o current_user.
+
+    user = await find_user_by_email(read_shards, subject_email)
     # Busca o usuário no banco de dados com base no email extraído do token.
+    # A busca pode ir para uma réplica; quem escreveu há pouco é mandado para o primário pelo get_read_session.
 
     if not user:
         raise credentials_exception
         # Se o usuário não for encontrado, levanta uma exceção HTTP 401.
 
+    snapshot = _principal_snapshot(user)
+    principal_cache.set(subject_email, snapshot)
+
+    session = shards.for_id(user.id)
+    if read_shards.for_id(user.id) is not session:
+        return await session.merge(_principal_from_snapshot(snapshot), load=False)
+        # Lido da réplica: anexa à sessão do primário do shard do usuário, que é a usada pelos endpoints de escrita.
     return user
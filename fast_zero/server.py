@@ -0,0 +1,192 @@
+"""Servidor de produção: uvicorn com vários workers, dimensionados pela CPU e pela memória do Argon2.
+
+Cada worker aquece antes de aceitar requisições (pool de conexões, processos de hashing, schema do OpenAPI),
+limita o threadpool ao tamanho do pool do banco e, no SIGTERM, para de aceitar conexões e espera as requisições em andamento.
+
+Uso: python -m fast_zero.server --port 8000
+     python -m fast_zero.server --dry-run   (só mostra o dimensionamento calculado)
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from contextlib import AsyncExitStack
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from time import perf_counter, time
+
+import uvicorn
+from anyio import to_thread
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool
+
+from fast_zero.metrics import REGISTRY, Gauge
+from fast_zero.settings import Settings, get_settings
+
+logger = logging.getLogger('uvicorn.error')
+# Mesmo logger das mensagens de startup do uvicorn, assim o tempo de cold start aparece junto com elas.
+
+COLD_START = REGISTRY.register(Gauge('fast_zero_cold_start_seconds', 'Worker startup time by phase (pool, hasher, app, total).', ['phase']))
+
+LAUNCH_TIME_ENV = 'FAST_ZERO_LAUNCH_TIME'
+# O launcher grava o instante em que foi iniciado; cada worker mede o cold start a partir dele.
+WORKER_BASE_MEMORY_MIB = 100
+HASHING_PROCESS_BASE_MEMORY_MIB = 40
+# Memória aproximada de um worker uvicorn ocioso e de um processo de hashing sem o buffer do Argon2 (ver benchmarks/load.py).
+
+
+@dataclass
+class WorkerPlan:
+    workers: int
+    cpus: int
+    memory_mib: int | None
+    worker_memory_mib: int
+    by_cpu: int
+    by_memory: int | None
+
+
+def available_cpus() -> int:
+    # sched_getaffinity respeita o taskset/cpuset do container; cpu_count conta todas as CPUs da máquina.
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory() -> int | None:
+    # Memória física, ou o limite do cgroup (v2 e v1) quando o container tem um limite menor.
+    limits = []
+    try:
+        limits.append(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+    except (AttributeError, ValueError, OSError):
+        pass
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            value = Path(path).read_text(encoding='utf-8').strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            limits.append(int(value))
+    return min(limits) if limits else None
+
+
+def plan_workers(settings: Settings, cpus: int | None = None, memory: int | None = None) -> WorkerPlan:
+    # Um worker por CPU (o event loop usa um núcleo), limitado pela memória: cada worker carrega HASHING_WORKERS processos
+    # e cada um deles aloca ARGON2_MEMORY_COST KiB por hash. Com 64 MiB e 2 processos de hashing => ~330 MiB por worker.
+    cpus = cpus or available_cpus()
+    memory = memory if memory is not None else available_memory()
+    worker_memory = WORKER_BASE_MEMORY_MIB + settings.HASHING_WORKERS * (HASHING_PROCESS_BASE_MEMORY_MIB + settings.ARGON2_MEMORY_COST // 1024)
+    by_memory = int(memory * settings.SERVER_MEMORY_FRACTION / (worker_memory * 1024 * 1024)) if memory else None
+    workers = settings.SERVER_WORKERS or max(1, min(cpus, by_memory if by_memory is not None else cpus))
+    return WorkerPlan(
+        workers=workers,
+        cpus=cpus,
+        memory_mib=memory // (1024 * 1024) if memory else None,
+        worker_memory_mib=worker_memory,
+        by_cpu=cpus,
+        by_memory=by_memory,
+    )
+
+
+def pool_capacity(engine, max_overflow: int = 0) -> tuple[int, int] | None:
+    # (conexões mantidas no pool, máximo de conexões simultâneas). None => pool sem tamanho fixo (NullPool, StaticPool...).
+    # O QueuePool não expõe o max_overflow: vem do Settings (DB_MAX_OVERFLOW), o mesmo usado no build_engine.
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    return pool.size(), pool.size() + max(max_overflow, 0)
+
+
+async def open_pool_connections(engine, count: int):
+    # Abre `count` conexões ao mesmo tempo e devolve todas: o pool fica com elas prontas para as primeiras requisições.
+    if isinstance(engine, AsyncEngine):
+        async with AsyncExitStack() as stack:
+            for _ in range(count):
+                connection = await stack.enter_async_context(engine.connect())
+                await connection.execute(text('SELECT 1'))
+        return
+
+    def open_all():
+        connections = [engine.connect() for _ in range(count)]
+        for connection in connections:
+            connection.execute(text('SELECT 1'))
+            connection.close()
+
+    await run_in_threadpool(open_all)
+
+
+async def warmup(app):
+    # Roda no lifespan de cada worker, antes do uvicorn começar a aceitar conexões, com os engines e o hasher do app já criados.
+    engine, hasher = app.state.engine, app.state.hasher
+    phases = {}
+    start = perf_counter()
+
+    capacity = pool_capacity(engine, app.state.settings.DB_MAX_OVERFLOW)
+    if capacity is not None and not isinstance(engine, AsyncEngine):
+        to_thread.current_default_thread_limiter().total_tokens = capacity[1]
+        # Driver síncrono: cada operação de banco ocupa uma thread. Mais threads que conexões só esperariam na fila do pool,
+        # com o padrão do anyio (40) o pool estoura o timeout antes do threadpool encher.
+    for database in (engine, *app.state.replicas.engines, *app.state.shard_engines):
+        database_capacity = pool_capacity(database)
+        await open_pool_connections(database, database_capacity[0] if database_capacity else 1)
+    phases['pool'] = perf_counter() - start
+
+    step = perf_counter()
+    await asyncio.gather(*(hasher.hash('warmup') for _ in range(hasher.workers)))
+    # Um hash por processo: sobe todos os workers do ProcessPoolExecutor (spawn + import do argon2) antes do primeiro login.
+    phases['hasher'] = perf_counter() - step
+
+    step = perf_counter()
+    app.openapi()
+    # O schema do OpenAPI é montado no primeiro acesso ao /docs; aqui ele já fica em cache.
+    phases['app'] = perf_counter() - step
+
+    launched = os.environ.get(LAUNCH_TIME_ENV)
+    phases['total'] = time() - float(launched) if launched else perf_counter() - start
+    # total => do início do launcher até o worker pronto (inclui o spawn do processo e os imports).
+    for phase, seconds in phases.items():
+        COLD_START.set(seconds, phase=phase)
+    logger.info('Worker %d ready: %s', os.getpid(), ', '.join(f'{phase}={seconds * 1000:.0f}ms' for phase, seconds in phases.items()))
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--workers', type=int, help='sobrescreve o cálculo automático (SERVER_WORKERS)')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    settings = get_settings()
+    plan = plan_workers(settings)
+    workers = args.workers or plan.workers
+    print(json.dumps({**asdict(plan), 'workers': workers}))
+    if args.dry_run:
+        return
+
+    os.environ[LAUNCH_TIME_ENV] = str(time())
+    os.environ['WARMUP_ON_STARTUP'] = 'true'
+    get_settings.cache_clear()
+    # Os workers herdam o ambiente: o lifespan de cada um faz o warmup. Com um worker só o uvicorn chama o create_app
+    # neste mesmo processo, então o Settings lido acima (sem o warmup) sai do cache.
+    uvicorn.run(
+        'fast_zero.app:create_app',
+        factory=True,
+        host=args.host or settings.SERVER_HOST,
+        port=args.port or settings.SERVER_PORT,
+        workers=workers,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        timeout_keep_alive=settings.SERVER_KEEP_ALIVE_SECONDS,
+        log_level='info',
+    )
+    # No SIGTERM o uvicorn fecha o socket, espera as requisições em andamento por até SERVER_GRACEFUL_TIMEOUT_SECONDS
+    # e só então roda o shutdown do lifespan (que encerra o pool de hashing).
+
+
+if __name__ == '__main__':
+    main()
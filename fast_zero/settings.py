@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -15,3 +18,127 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    DATABASE_REPLICA_URLS: list[str] = []
+    # Réplicas só de leitura, ex: DATABASE_REPLICA_URLS='["postgresql+psycopg://replica1/app"]'. Vazio => tudo vai para o primário.
+    REPLICA_RETRY_SECONDS: float = 5
+    # Intervalo da checagem de saúde das réplicas e tempo que uma réplica com erro fica fora da rotação.
+    READ_YOUR_WRITES_SECONDS: float = 5
+    # Depois de escrever, o usuário lê do primário por esse tempo (cobre o atraso de replicação).
+    DATABASE_SHARD_URLS: list[str] = []
+    # Shards extras da tabela users (o DATABASE_URL é o shard 0). O shard de cada usuário é escolhido pelo hash do email.
+    # Ligar só em uma base nova: os ids passam a carregar o número do shard (id % 1024).
+
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # Conexões mantidas abertas por engine e quantas a mais podem ser abertas nos picos (fechadas quando voltam ao pool).
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    # Tempo máximo esperando uma conexão livre antes do TimeoutError do pool.
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Conexões mais velhas que isso são reabertas no checkout (firewalls e o próprio servidor derrubam as ociosas). -1 => nunca.
+    DB_POOL_PRE_PING: bool = True
+    # Ping no checkout: uma conexão derrubada é trocada antes de chegar à requisição.
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    # Cache de SQL compilado do SQLAlchemy e de prepared statements do driver (sqlite3, asyncpg, psycopg). 0 => desligado.
+    SQLITE_JOURNAL_MODE: Literal['WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY'] = 'WAL'
+    # WAL: leitores não bloqueiam o escritor nem esperam por ele.
+    SQLITE_SYNCHRONOUS: Literal['OFF', 'NORMAL', 'FULL', 'EXTRA'] = 'NORMAL'
+    # NORMAL com WAL: fsync só no checkpoint. Uma queda de energia pode perder os últimos commits, mas não corrompe o arquivo.
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # Quanto uma escrita espera pelo lock antes de falhar com "database is locked".
+    SQLITE_CACHE_SIZE_KIB: int = 16384
+    # Cache de páginas de cada conexão (o padrão do SQLite é ~2 MiB).
+    SQLITE_MMAP_SIZE_MIB: int = 256
+    # Leituras pelo mmap do arquivo, sem copiar as páginas para o cache de cada conexão. 0 => desligado.
+
+    HASHING_WORKERS: int = 2
+    # Quantidade de processos dedicados ao Argon2.
+    HASHING_QUEUE_DEPTH: int = 32
+    # Quantos hashes podem ficar esperando um worker livre antes de responder 503.
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    # Quantos usuários autenticados ficam em cache no get_current_user (0 desliga o cache).
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    # Nunca passa do tempo de expiração do token.
+
+    SLOW_QUERY_MS: float = 200
+    # Comandos SQL mais lentos que isso são registrados no log com o SQL normalizado.
+    N_PLUS_ONE_THRESHOLD: int = 10
+    # Se o mesmo formato de comando rodar mais vezes que isso em uma requisição, ela é marcada como provável N+1.
+    DB_DEBUG_HEADERS: bool = False
+    # Liga os headers X-DB-Queries e X-DB-Time nas respostas.
+
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    # em KiB
+    ARGON2_PARALLELISM: int = 4
+    # Parâmetros do Argon2. Use python -m fast_zero.calibrate para ajustar ao hardware; hashes antigos
+    # são migrados para os novos parâmetros no próximo login.
+
+    LOGIN_RATE_ACCOUNT_CAPACITY: int = 5
+    LOGIN_RATE_ACCOUNT_PER_MINUTE: float = 5
+    # Tentativas de login por conta: rajada máxima e reposição por minuto.
+    LOGIN_RATE_IP_CAPACITY: int = 20
+    LOGIN_RATE_IP_PER_MINUTE: float = 20
+    # Tentativas de login por IP de origem.
+    LOGIN_AUDIT_FLUSH_MS: float = 500
+    LOGIN_AUDIT_BATCH_SIZE: int = 500
+    # A trilha de logins (login_events e users.last_login_at) é gravada em lote a cada LOGIN_AUDIT_FLUSH_MS
+    # ou assim que a fila junta LOGIN_AUDIT_BATCH_SIZE eventos.
+    LOGIN_AUDIT_MAX_PENDING: int = 10_000
+    # Eventos esperando na memória; acima disso são descartados (o login não espera o banco).
+    LOGIN_AUDIT_DRAIN_TIMEOUT_SECONDS: float = 10
+    # No shutdown, tempo máximo gravando o que ficou na fila.
+
+    CONCURRENCY_LIMITS_ENABLED: bool = True
+    CONCURRENCY_INITIAL_LIMIT: int = 32
+    CONCURRENCY_MIN_LIMIT: int = 2
+    CONCURRENCY_MAX_LIMIT: int = 256
+    CONCURRENCY_TARGET_LATENCY_MS: dict[str, float] = {'auth': 500, 'hash': 500, 'write': 250, 'read': 100, 'export': 500}
+    # Latência alvo (até o início da resposta) por classe de rota (todas obrigatórias); acima dela o limite de requisições simultâneas diminui.
+    # hash => cadastro, PUT e PATCH, que podem calcular o Argon2. export => GET /users/export, que segura a vaga durante o download.
+    CONCURRENCY_EXPORT_MAX_LIMIT: int = 4
+    # Exports simultâneos no máximo; os demais esperam na fila da classe export.
+    CONCURRENCY_QUEUE_TIMEOUT_MS: float = 1000
+    # Tempo máximo na fila esperando uma vaga antes de responder 503 com Retry-After.
+    # A fila de cada classe guarda até CONCURRENCY_MAX_LIMIT requisições; além disso o 503 é imediato.
+
+    CACHE_CONTROL: dict[str, str] = {'/users/': 'private, no-cache', '/users/{user_id}': 'private, no-cache'}
+    # Cache-Control por rota (template do caminho). no-cache => o cliente sempre revalida com If-None-Match e recebe 304 se nada mudou.
+    SYNC_SETTLE_SECONDS: float = 2
+    # GET /users/changes só entrega mudanças mais antigas que isso: dá tempo das transações em andamento
+    # (com updated_at já definido, mas ainda sem commit) terminarem, senão o watermark passaria por cima delas.
+
+    COALESCE_READS: bool = True
+    # Requisições idênticas e simultâneas de GET /users e /users/search compartilham uma única execução.
+    COALESCE_TTL_MS: float = 0
+    # Micro-cache do resultado coalescido (ex: 50). 0 => só junta as requisições que chegam enquanto a primeira executa.
+
+    PROFILE_SAMPLE_RATE: float = 0
+    # Fração das requisições profiladas (ex: 0.01 => 1%). 0 => só as que trazem o header X-Profile assinado.
+    PROFILE_SECRET: str = ''
+    # Chave do header X-Profile (python -m fast_zero.profiling gera um valor). Vazio => header ignorado.
+    PROFILE_MODE: Literal['sampling', 'cprofile'] = 'sampling'
+    # sampling => pilhas amostradas em .collapsed (flamegraph), cprofile => .pstats com todas as chamadas.
+    PROFILE_DIR: str = 'profiles'
+    PROFILE_MAX_FILES: int = 50
+    # Quantos profiles ficam guardados por rota; os mais antigos são apagados.
+    PROFILE_INTERVAL_MS: float = 1
+    # Intervalo entre as amostras do modo sampling.
+
+    SERVER_HOST: str = '0.0.0.0'
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    # Workers do uvicorn no python -m fast_zero.server. 0 => um por CPU, limitado pela memória (ver SERVER_MEMORY_FRACTION).
+    SERVER_MEMORY_FRACTION: float = 0.75
+    # Fração da memória (ou do limite do container) que os workers e os processos de hashing podem ocupar.
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    # No SIGTERM, tempo máximo esperando as requisições em andamento terminarem.
+    SERVER_KEEP_ALIVE_SECONDS: int = 5
+    WARMUP_ON_STARTUP: bool = False
+    # Aquece pool de conexões e processos de hashing no lifespan. O python -m fast_zero.server liga sozinho.
+
+
+@lru_cache
+def get_settings() -> Settings:
+    # Um único Settings por processo, criado no primeiro uso: o .env é lido uma vez só e nunca na importação dos módulos.
+    return Settings()
@@ -0,0 +1,240 @@
+import asyncio
+import heapq
+from contextlib import AsyncExitStack
+from hashlib import blake2b
+
+from fastapi import Depends, Request
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from fast_zero.database import get_read_session, get_session, open_session
+from fast_zero.models import User, UserKey
+
+# Sharding da tabela users por hash do email. O shard 0 é o próprio DATABASE_URL e DATABASE_SHARD_URLS acrescenta os demais.
+# Sem DATABASE_SHARD_URLS existe um shard só e tudo funciona exatamente como antes (ids autoincrementais, sem user_keys).
+
+SHARD_ID_STRIDE = 1024
+# Ids globais: id % SHARD_ID_STRIDE é o shard onde o usuário mora, então /users/{user_id} vai direto para o shard certo.
+# Cada shard usa os ids índice + 1024, índice + 2048... (até 1024 shards sem renumerar nada); nenhum id é 0, nem no shard 0.
+
+
+def key_shard(key: str, count: int) -> int:
+    # Hash estável (blake2b e não hash(), que muda a cada processo): a mesma chave cai sempre no mesmo shard.
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'big') % count
+
+
+def user_keys(username: str | None = None, email: str | None = None) -> list[str]:
+    keys = []
+    if username is not None:
+        keys.append(f'username:{username}')
+    if email is not None:
+        keys.append(f'email:{email}')
+    return keys
+
+
+class Shards:
+    # Sessões de uma requisição, uma por shard. A do shard 0 é a sessão normal da requisição.
+    def __init__(self, sessions: list):
+        self.sessions = sessions
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.sessions) > 1
+
+    def index_for_email(self, email: str) -> int:
+        # O email só decide o shard no cadastro; depois o usuário fica nesse shard mesmo trocando de email.
+        return key_shard(email, len(self.sessions))
+
+    def for_email(self, email: str):
+        return self.sessions[self.index_for_email(email)]
+
+    def for_id(self, user_id: int):
+        # None => o id aponta para um shard que não existe (id inválido).
+        if not self.sharded:
+            return self.sessions[0]
+        index = user_id % SHARD_ID_STRIDE
+        return self.sessions[index] if index < len(self.sessions) else None
+
+
+def _group_by_shard(keys, count: int):
+    groups = {}
+    for key in keys:
+        groups.setdefault(key_shard(key, count), []).append(key)
+    return groups.items()
+
+
+async def get_shards(request: Request, session=Depends(get_session)):
+    # Os engines dos shards extras são do app (request.app.state.shard_engines, criados no lifespan).
+    async with AsyncExitStack() as stack:
+        yield Shards([session, *[await stack.enter_async_context(open_session(engine)) for engine in request.app.state.shard_engines]])
+
+
+async def get_read_shards(request: Request, session=Depends(get_read_session)):
+    # Igual ao get_shards, mas o shard 0 pode ser atendido por uma réplica de leitura.
+    async with AsyncExitStack() as stack:
+        yield Shards([session, *[await stack.enter_async_context(open_session(engine)) for engine in request.app.state.shard_engines]])
+
+
+def next_id(index: int):
+    # Próximo id do shard calculado dentro do próprio INSERT (subquery), sem uma consulta separada antes.
+    return select(func.coalesce(func.max(User.id), index) + SHARD_ID_STRIDE).scalar_subquery()
+
+
+async def find_user_by_email(shards: Shards, email: str):
+    # Normalmente o usuário está no shard do hash do email; quem trocou de email depois do cadastro mora em outro,
+    # por isso se não encontrar procura nos demais.
+    home = shards.for_email(email)
+    user = await home.scalar(select(User).where(User.email == email))
+    if user is None and shards.sharded:
+        for session in shards.sessions:
+            if session is not home:
+                user = await session.scalar(select(User).where(User.email == email))
+                if user is not None:
+                    break
+    return user
+
+
+async def claim_keys(shards: Shards, keys: list[str]):
+    # Unicidade entre shards: cada username/email vira uma linha em user_keys, no shard do hash da chave.
+    # A chave primária de user_keys impede que duas requisições fiquem com o mesmo username/email em shards diferentes.
+    # Levanta IntegrityError (como o INSERT em users faria) e desfaz o que já tinha reservado.
+    if not shards.sharded:
+        return
+    claimed = []
+    for index, group in _group_by_shard(keys, len(shards.sessions)):
+        session = shards.sessions[index]
+        try:
+            await session.execute(insert(UserKey), [{'key': key} for key in group])
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            await release_keys(shards, claimed)
+            raise
+        claimed.extend(group)
+
+
+async def release_keys(shards: Shards, keys: list[str]):
+    if not shards.sharded:
+        return
+    for index, group in _group_by_shard(keys, len(shards.sessions)):
+        session = shards.sessions[index]
+        await session.execute(delete(UserKey).where(UserKey.key.in_(group)))
+        await session.commit()
+
+
+async def taken_keys(shards: Shards, usernames: set[str], emails: set[str]) -> set[str]:
+    # Quais desses usernames/emails já estão em uso, em uma consulta por shard.
+    if not shards.sharded:
+        existing = (
+            await shards.sessions[0].execute(select(User.username, User.email).where(User.username.in_(usernames) | User.email.in_(emails)))
+        ).all()
+        return {row.username for row in existing} | {row.email for row in existing}
+
+    keys = [*(f'username:{username}' for username in usernames), *(f'email:{email}' for email in emails)]
+    taken = set()
+    for index, group in _group_by_shard(keys, len(shards.sessions)):
+        taken.update(key.split(':', 1)[1] for key in await shards.sessions[index].scalars(select(UserKey.key).where(UserKey.key.in_(group))))
+    return taken
+
+
+async def insert_users(shards: Shards, rows: list[dict]) -> list:
+    # INSERT ... RETURNING em lote. Devolve as linhas (id, username, email) na mesma ordem de `rows`.
+    returning = insert(User).returning(User.id, User.username, User.email, sort_by_parameter_order=True)
+    if not shards.sharded:
+        session = shards.sessions[0]
+        try:
+            created = list(await session.execute(returning, rows))
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            raise
+        return created
+
+    keys = [key for row in rows for key in user_keys(row['username'], row['email'])]
+    await claim_keys(shards, keys)
+    groups = {}
+    for position, row in enumerate(rows):
+        groups.setdefault(shards.index_for_email(row['email']), []).append(position)
+
+    created = [None] * len(rows)
+    for index, positions in groups.items():
+        session = shards.sessions[index]
+        for attempt in range(2):
+            first = await session.scalar(select(next_id(index)))
+            # Reserva um bloco de ids do shard de uma vez; o INSERT em lote não pode usar a subquery linha a linha.
+            try:
+                result = await session.execute(
+                    returning, [{**rows[position], 'id': first + offset * SHARD_ID_STRIDE} for offset, position in enumerate(positions)]
+                )
+                inserted = list(zip(positions, result))
+                await session.commit()
+                for position, row in inserted:
+                    created[position] = row
+                break
+            except IntegrityError:
+                await session.rollback()
+                # username/email já estão reservados em user_keys: o conflito só pode ser o bloco de ids,
+                # pego por outra requisição no mesmo shard. Tenta de novo com um bloco novo.
+                if attempt:
+                    pending = [row for position, row in enumerate(rows) if created[position] is None]
+                    await release_keys(shards, [key for row in pending for key in user_keys(row['username'], row['email'])])
+                    raise
+    return created
+
+
+async def fetch_merged(shards: Shards, query, limit: int, offset: int = 0, key=lambda row: row.id) -> list:
+    # Página de uma consulta ordenada (por padrão por id) em todos os shards. Cada shard devolve as suas primeiras
+    # offset + limit linhas (já ordenadas) e o merge mantém a ordem global; sem sharding é a consulta com LIMIT/OFFSET de sempre.
+    if not shards.sharded:
+        if offset:
+            query = query.offset(offset)
+        return (await shards.sessions[0].execute(query.limit(limit))).all()
+
+    results = await asyncio.gather(*(session.execute(query.limit(offset + limit)) for session in shards.sessions))
+    return list(heapq.merge(*(result.all() for result in results), key=key))[offset : offset + limit]
+
+
+async def _next_or_none(iterator):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def merge_sorted(streams, key, batch_size: int = 1000):
+    # Merge de k fluxos já ordenados (um por shard) em um único fluxo ordenado, lendo só a linha da frente de cada um.
+    # Cada fluxo entrega lotes de linhas, como o stream_rows; a saída também sai em lotes de até batch_size.
+    async def rows(stream):
+        try:
+            async for partition in stream:
+                for row in partition:
+                    yield row
+        finally:
+            await stream.aclose()
+
+    iterators = [rows(stream) for stream in streams]
+    try:
+        heap = []
+        for position, iterator in enumerate(iterators):
+            row = await _next_or_none(iterator)
+            if row is not None:
+                heap.append((key(row), position, row))
+        heapq.heapify(heap)
+
+        batch = []
+        while heap:
+            _, position, row = heap[0]
+            batch.append(row)
+            following = await _next_or_none(iterators[position])
+            if following is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (key(following), position, following))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        for iterator in iterators:
+            await iterator.aclose()
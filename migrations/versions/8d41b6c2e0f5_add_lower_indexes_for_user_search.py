@@ -0,0 +1,31 @@
+"""add lower() indexes for user search
+
+Revision ID: 8d41b6c2e0f5
+Revises: 3c9e1f7a2b64
+Create Date: 2026-10-18 11:03:47.902115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41b6c2e0f5'
+down_revision: Union[str, Sequence[str], None] = '3c9e1f7a2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Índices funcionais (SQLite >= 3.9, PostgreSQL, MySQL >= 8.0.13) para a busca por prefixo sem diferenciar maiúsculas.
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)')], unique=False)
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.drop_index('ix_users_username_lower', table_name='users')
@@ -4,41 +4,62 @@ from datetime import datetime
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
-from fast_zero.app import app
-from fast_zero.database import get_session
+from fast_zero.app import create_app
+from fast_zero.database import ReplicaRouter
 from fast_zero.models import User, table_registry
-from fast_zero.security import get_password_hash
+from fast_zero.security import build_hasher, get_password_hash
+from fast_zero.settings import get_settings
+
+
+@pytest.fixture(scope='session')
+def hasher():
+    # Um pool de hashing para a suíte inteira: subir os processos (spawn) em cada teste deixaria tudo bem mais lento.
+    hasher = build_hasher(get_settings())
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.fixture(params=['sync', 'async'])
+def db_mode(request):
+    # Toda a suíte que usa banco roda duas vezes: com o engine síncrono (pysqlite) e com o assíncrono (aiosqlite).
+    return request.param
 
 
 @pytest.fixture  # Fixture do pytest que cria um cliente de teste para a aplicação FastAPI.
-def client(session):
+def client(session, db_mode, tmp_path, hasher):
     # session é uma fixture que cria uma sessão de banco de dados em memória.
-    # Ira sobreescrever a dependência get_session do app para usar o banco de dados em memória.
-    # Forçando o uso do banco de dados em memória e resetando os dados a cada teste.
-    def get_session_override():
-        # Ira sobreescrever a dependência get_session do app para usar o banco de dados em memória.
-        # Forçando o uso do banco de dados em memória e resetando os dados a cada teste.
-        return session
-
+    # Um app novo por teste, montado com o engine do banco de teste: sem dependency_overrides e sem estado
+    # (cache de usuários, limites de login) vazando de um teste para o outro.
+    engine = session.bind
+    # No modo sync é o próprio engine da fixture session (StaticPool => mesma conexão em memória).
+    if db_mode == 'async':
+        engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "test.db"}', poolclass=NullPool)
+        # No modo async o app usa o aiosqlite apontando para o mesmo arquivo da fixture session.
+        # NullPool => cada sessão abre e fecha a própria conexão, nada fica preso ao event loop do TestClient.
+
+    settings = get_settings().model_copy(update={'LOGIN_AUDIT_FLUSH_MS': 60_000})
+    # model_copy => cada teste pode alterar o client.app.state.settings sem afetar os outros.
+    # Auditoria de login sem flush periódico: grava só no flush chamado pelo teste ou no shutdown do app.
+    app = create_app(settings, engine=engine, replicas=ReplicaRouter([]), shard_engines=[], hasher=hasher)
     with TestClient(app) as client:
-        app.dependency_overrides[get_session] = get_session_override
-        # Sobrescreve a dependência get_session do app para usar a função get_session_override.
-        # Isso faz com que o app use a sessão do banco de dados em memória para os testes.
         yield client
 
-    app.dependency_overrides.clear()
-    # Limpa as substituições de dependência após o teste.
-
 
 @pytest.fixture
-def session():
+def session(db_mode, tmp_path):
+    url = 'sqlite:///:memory:'
+    if db_mode == 'async':
+        url = f'sqlite:///{tmp_path / "test.db"}'
+        # O modo async precisa de um arquivo, pois o banco em memória não é compartilhado entre o pysqlite e o aiosqlite.
+
     engine = create_engine(
         # create_engine('sqlite:///./test.db', echo=True) # echo=True => Habilita o log de todas as operações SQL executadas pela engine.
         # engine e engrenagem de conexão com o banco de dados.
-        'sqlite:///:memory:',
+        url,
         connect_args={'check_same_thread': False},
         # false para permitir que a conexão seja compartilhada entre diferentes threads.
         poolclass=StaticPool,
@@ -87,6 +108,62 @@ def mock_db_time():
     return _mock_db_time
 
 
+@pytest.fixture
+def query_budget(client, monkeypatch):
+    # Liga os headers X-DB-Queries/X-DB-Time e devolve uma função que confere o orçamento de queries de uma resposta.
+    monkeypatch.setattr(client.app.state.settings, 'DB_DEBUG_HEADERS', True)
+
+    def check(response, max_queries):
+        queries = int(response.headers['X-DB-Queries'])
+        assert queries <= max_queries, f'{queries} queries executed, budget is {max_queries}'
+
+    return check
+
+
+@pytest.fixture
+def replica(client, db_mode, tmp_path):
+    # Réplica de leitura em outro arquivo SQLite. Tem o mesmo usuário do fixture user (para a autenticação funcionar)
+    # e um usuário que só existe nela, assim os testes sabem se a resposta veio da réplica ou do primário.
+    path = tmp_path / 'replica.db'
+    seed_engine = create_engine(f'sqlite:///{path}')
+    table_registry.metadata.create_all(seed_engine)
+    with Session(seed_engine) as replica_session:
+        replica_session.add_all([
+            User(username='Teste', email='teste@test.com', password='replica'),
+            User(username='replica-only', email='replica@test.com', password='replica'),
+        ])
+        replica_session.commit()
+    seed_engine.dispose()
+
+    if db_mode == 'async':
+        engine = create_async_engine(f'sqlite+aiosqlite:///{path}', poolclass=NullPool)
+    else:
+        engine = create_engine(f'sqlite:///{path}', connect_args={'check_same_thread': False})
+
+    client.app.state.replicas.add(engine)
+    return engine
+
+
+@pytest.fixture
+def shard_engines(client, db_mode, tmp_path):
+    # Dois shards extras em arquivos SQLite separados; o shard 0 é o banco da fixture session.
+    engines = []
+    for index in (1, 2):
+        path = tmp_path / f'shard{index}.db'
+        seed_engine = create_engine(f'sqlite:///{path}')
+        table_registry.metadata.create_all(seed_engine)
+        seed_engine.dispose()
+        if db_mode == 'async':
+            engines.append(create_async_engine(f'sqlite+aiosqlite:///{path}', poolclass=NullPool))
+        else:
+            engines.append(create_engine(f'sqlite:///{path}', connect_args={'check_same_thread': False}))
+
+    client.app.state.shard_engines = engines
+    client.app.state.login_audit.engines = [client.app.state.engine, *engines]
+    # O app já subiu com um shard só: a auditoria de login também passa a gravar no shard de cada usuário.
+    return engines
+
+
 @pytest.fixture
 def user(session):
     password = 'testtest'
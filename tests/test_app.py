@@ -1,3 +1,6 @@
+import os
+import subprocess
+import sys
 from http import HTTPStatus
 
 # importa para converter o objeto user (instância do modelo ORM User) em um dicionário usando o Pydantic UserPublic.
@@ -11,6 +14,19 @@ def test_read_root_deve_retornar_ok_e_ola_mundo(client):
     assert responde.json() == {'message': 'Olá Mundo'}
 
 
+def test_importar_modulos_nao_le_settings_nem_cria_engine(tmp_path):
+    # Sem DATABASE_URL e sem .env (cwd vazio): importar os módulos não pode instanciar o Settings.
+    code = (
+        'import fast_zero.database, fast_zero.security, fast_zero.sharding, fast_zero.routers.users\n'
+        'from fast_zero.app import create_app\n'
+        'from fast_zero.settings import get_settings\n'
+        'assert get_settings.cache_info().currsize == 0'
+    )
+    env = {'PATH': os.environ['PATH'], 'PYTHONPATH': os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env, capture_output=True, text=True, check=False)
+    assert result.returncode == 0, result.stderr
+
+
 """'
 FUNÇÕES ABAIXO NÃO FAZEM PARTE DA REGRA DE NEGÓCIO, FORAM APAGADAS, MAS DEIXADAS AQUI PARA NÃO PERDER O HISTÓRICO DE EVOLUÇÃO DO CÓDIGO.
 
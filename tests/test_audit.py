@@ -0,0 +1,86 @@
+import asyncio
+from http import HTTPStatus
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+
+from fast_zero.app import create_app
+from fast_zero.audit import LOGIN_AUDIT_EVENTS, LoginAuditWriter
+from fast_zero.database import ReplicaRouter
+from fast_zero.models import LoginEvent, User, table_registry
+from fast_zero.settings import get_settings
+
+
+def _login(client, user):
+    return client.post('/auth/token', data={'username': user.email, 'password': user.clean_password})
+
+
+def test_login_is_audited_after_flush(client, session, user):
+    updated_at = user.updated_at
+
+    assert _login(client, user).status_code == HTTPStatus.OK
+    login_audit = client.app.state.login_audit
+    assert login_audit.pending == 1
+    assert session.scalar(select(LoginEvent)) is None
+    # Nada foi gravado durante o login.
+
+    client.portal.call(login_audit.flush)
+
+    session.expire_all()
+    event = session.scalar(select(LoginEvent))
+    assert event.user_id == user.id
+    assert event.ip == 'testclient'
+    refreshed = session.get(User, user.id)
+    assert refreshed.last_login_at == event.logged_in_at
+    assert refreshed.updated_at == updated_at
+    # Login não conta como alteração do usuário (ETag e GET /users/changes).
+
+
+def test_failed_login_is_not_audited(client, user):
+    client.post('/auth/token', data={'username': user.email, 'password': 'wrong'})
+
+    assert client.app.state.login_audit.pending == 0
+
+
+def test_shutdown_drains_pending_logins(tmp_path, hasher, user):
+    engine = create_engine(f'sqlite:///{tmp_path / "audit.db"}')
+    table_registry.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), {'id': 7, 'username': user.username, 'email': user.email, 'password': user.password})
+    settings = get_settings().model_copy(update={'LOGIN_AUDIT_FLUSH_MS': 60_000})
+    app = create_app(settings, engine=engine, replicas=ReplicaRouter([]), shard_engines=[], hasher=hasher)
+
+    with TestClient(app) as client:
+        for _ in range(3):
+            assert _login(client, user).status_code == HTTPStatus.OK
+        assert app.state.login_audit.pending == 3  # noqa: PLR2004
+
+    with engine.connect() as connection:
+        assert connection.scalar(select(LoginEvent.user_id).distinct()) == 7  # noqa: PLR2004
+        assert len(connection.execute(select(LoginEvent)).all()) == 3  # noqa: PLR2004
+        assert connection.scalar(select(User.last_login_at)) is not None
+    engine.dispose()
+
+
+def test_writer_batches_and_bounds_queue(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "audit.db"}')
+    table_registry.metadata.create_all(engine)
+    dropped = LOGIN_AUDIT_EVENTS._values.get(('dropped',), 0)
+
+    async def run():
+        writer = LoginAuditWriter([engine], flush_interval=60, batch_size=2, max_pending=3)
+        writer.start()
+        for user_id in range(4):
+            writer.record(user_id, '127.0.0.1')
+        await asyncio.sleep(0.2)
+        # batch_size atingido: o loop grava sem esperar o flush_interval.
+        written = writer.pending
+        await writer.stop(timeout=5)
+        return written
+
+    assert asyncio.run(run()) == 0
+    assert LOGIN_AUDIT_EVENTS._values[('dropped',)] == dropped + 1
+    # max_pending=3: o quarto evento é descartado, não bloqueia quem chamou record.
+    with engine.connect() as connection:
+        assert len(connection.execute(select(LoginEvent)).all()) == 3  # noqa: PLR2004
+    engine.dispose()
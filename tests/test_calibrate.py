@@ -0,0 +1,25 @@
+from fast_zero.calibrate import calibrate, write_env
+
+
+def test_calibrate_returns_parameters_under_target():
+    result = calibrate(target_ms=1_000, memory_cost=1024, parallelism=1, min_memory_cost=1024, max_time_cost=2, samples=1)
+
+    assert result['memory_cost'] == 1024  # noqa: PLR2004
+    assert result['time_cost'] in {1, 2}
+    assert result['verify_ms'] <= 1_000  # noqa: PLR2004
+
+
+def test_calibrate_lowers_memory_when_target_is_too_small():
+    result = calibrate(target_ms=0, memory_cost=4096, parallelism=1, min_memory_cost=1024, max_time_cost=1, samples=1)
+
+    assert result['time_cost'] == 1
+    assert result['memory_cost'] == 1024  # noqa: PLR2004
+
+
+def test_write_env_updates_and_appends(tmp_path):
+    env_file = tmp_path / '.env'
+    env_file.write_text('DATABASE_URL="sqlite:///database.db"\nARGON2_TIME_COST=3\n', encoding='utf-8')
+
+    write_env(env_file, {'ARGON2_TIME_COST': 2, 'ARGON2_MEMORY_COST': 19456})
+
+    assert env_file.read_text(encoding='utf-8') == 'DATABASE_URL="sqlite:///database.db"\nARGON2_TIME_COST=2\nARGON2_MEMORY_COST=19456\n'
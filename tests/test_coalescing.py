@@ -0,0 +1,169 @@
+import asyncio
+from http import HTTPStatus
+
+import httpx
+import pytest
+
+from fast_zero.coalescing import COALESCED, SingleFlight
+from fast_zero.models import User
+from fast_zero.routers import users
+from fast_zero.security import get_password_hash
+
+
+def _count(name, result):
+    return COALESCED._values.get((name, result), 0)
+
+
+def test_single_flight_runs_once_for_concurrent_calls():
+    flight = SingleFlight('test-once')
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b'page'
+
+    async def run():
+        return await asyncio.gather(*(flight.do('key', load) for _ in range(5)))
+
+    merged = _count('test-once', 'merged')
+    assert asyncio.run(run()) == [b'page'] * 5
+    assert len(calls) == 1
+    assert _count('test-once', 'merged') - merged == 4  # noqa: PLR2004
+    assert not flight._inflight
+
+
+def test_single_flight_keeps_different_keys_apart():
+    flight = SingleFlight('test-keys')
+
+    async def run():
+        async def load(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(flight.do('a', lambda: load('a')), flight.do('b', lambda: load('b')))
+
+    assert asyncio.run(run()) == ['a', 'b']
+
+
+def test_single_flight_shares_errors_without_caching_them():
+    flight = SingleFlight('test-errors', ttl=60)
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    async def run():
+        return await asyncio.gather(flight.do('key', fail), flight.do('key', fail), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert len(calls) == 1
+
+    asyncio.run(run())
+    assert len(calls) == 2  # noqa: PLR2004
+
+
+def test_single_flight_micro_ttl_serves_recent_result():
+    flight = SingleFlight('test-ttl', ttl=60)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return len(calls)
+
+    assert asyncio.run(flight.do('key', load)) == 1
+    assert asyncio.run(flight.do('key', load)) == 1
+    assert len(calls) == 1
+    assert _count('test-ttl', 'cached') >= 1
+
+
+def test_single_flight_disabled_always_executes():
+    flight = SingleFlight('test-disabled', enabled=False)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(flight.do('key', load), flight.do('key', load))
+
+    asyncio.run(run())
+    assert len(calls) == 2  # noqa: PLR2004
+
+
+def test_single_flight_waiter_runs_again_when_leader_is_cancelled():
+    flight = SingleFlight('test-cancel')
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def run():
+        leader = asyncio.create_task(flight.do('key', load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do('key', load))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        # O cliente da primeira requisição desconectou: quem esperava não pode receber o CancelledError dele.
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(run()) == 2  # noqa: PLR2004
+
+
+def test_concurrent_reads_are_coalesced_and_writer_reads_its_write(client, session, user, token, db_mode, monkeypatch):  # noqa: PLR0913, PLR0917
+    if db_mode == 'sync':
+        pytest.skip('a sessão da fixture no modo sync é uma só e não aceita requisições simultâneas')
+
+    reader = User(username='reader', email='reader@test.com', password=get_password_hash('secret'))
+    session.add(reader)
+    session.commit()
+    reader_token = client.post('/auth/token', data={'username': 'reader@test.com', 'password': 'secret'}).json()['access_token']
+
+    fetch_merged = users.fetch_merged
+
+    async def slow_fetch_merged(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        # Segura a consulta para as requisições se sobreporem.
+        return await fetch_merged(*args, **kwargs)
+
+    monkeypatch.setattr(users, 'fetch_merged', slow_fetch_merged)
+
+    def usernames(response):
+        assert response.status_code == HTTPStatus.OK
+        return {row['username'] for row in response.json()['users']}
+
+    async def run():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as http:
+
+            async def read():
+                return await http.get('/users/', headers={'Authorization': f'Bearer {reader_token}'})
+
+            async def write_then_read():
+                await asyncio.sleep(0.01)
+                response = await http.patch(f'/users/{user.id}', json={'username': 'renamed'}, headers={'Authorization': f'Bearer {token}'})
+                assert response.status_code == HTTPStatus.OK
+                return await http.get('/users/', headers={'Authorization': f'Bearer {token}'})
+
+            *reads, own_read = await asyncio.gather(*(read() for _ in range(6)), write_then_read())
+            after = await read()
+            return reads, own_read, after
+
+    merged = _count('users', 'merged')
+    reads, own_read, after = asyncio.run(run())
+
+    for response in reads:
+        assert usernames(response) in ({'Teste', 'reader'}, {'renamed', 'reader'})
+        # Cada leitura vê o estado de antes ou de depois da escrita, nunca uma mistura.
+    assert usernames(own_read) == {'renamed', 'reader'}
+    # Quem escreveu não entra na leitura compartilhada que começou antes da escrita.
+    assert usernames(after) == {'renamed', 'reader'}
+    assert _count('users', 'merged') - merged >= 5  # noqa: PLR2004
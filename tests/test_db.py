@@ -1,8 +1,27 @@
+import asyncio
 from dataclasses import asdict
+from http import HTTPStatus
 
-from sqlalchemy import select
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
+from fast_zero.database import (
+    QueryStats,
+    ReplicaRouter,
+    TimedAsyncQueuePool,
+    build_engine,
+    dispose_engine,
+    engine_options,
+    is_async_url,
+    normalize_sql,
+    pool_status,
+    query_stats,
+)
+from fast_zero.metrics import DB_POOL_WAIT
 from fast_zero.models import User
+from fast_zero.settings import get_settings
 
 
 def test_create_user_db(session, mock_db_time):
@@ -20,4 +39,185 @@ def test_create_user_db(session, mock_db_time):
         'email': 'teste@test',
         'created_at': time,  # Usa o time gerado por mock_db_time para validar o campo created_at.
         'updated_at': time,  # Exercício
+        'last_login_at': None,
     }
+
+
+def test_is_async_url():
+    assert is_async_url('sqlite+aiosqlite:///database.db')
+    assert not is_async_url('sqlite:///database.db')
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT *\n  FROM users WHERE id = 10 AND name = 'x' AND email IN (?, ?, ?)") == (
+        'SELECT * FROM users WHERE id = ? AND name = ? AND email IN (...)'
+    )
+    assert normalize_sql('SELECT * FROM users WHERE email = %(email_1)s') == 'SELECT * FROM users WHERE email = ?'
+
+
+def test_query_stats_flags_repeated_statements(session, caplog):
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        for user_id in range(12):
+            session.execute(text(f'SELECT * FROM users WHERE id = {user_id}'))
+    finally:
+        query_stats.reset(token)
+
+    assert stats.count == 12  # noqa: PLR2004
+    assert stats.repeated == {'SELECT * FROM users WHERE id = ?'}
+    assert 'Possible N+1' in caplog.text
+
+
+def test_slow_query_is_logged(session, caplog, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'SLOW_QUERY_MS', 0)
+    # Fora de uma requisição vale o Settings do processo.
+
+    session.execute(text("SELECT * FROM users WHERE username = 'alice'"))
+
+    assert 'Slow query' in caplog.text
+    assert 'SELECT * FROM users WHERE username = ?' in caplog.text
+
+
+def test_failed_statement_does_not_leave_query_timer():
+    engine = create_engine('sqlite://')
+    stats = QueryStats()
+    with engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text('SELECT * FROM missing_table'))
+        token = query_stats.set(stats)
+        try:
+            connection.execute(text('SELECT 1'))
+        finally:
+            query_stats.reset(token)
+
+        assert 'query_start_time' not in connection.info
+    engine.dispose()
+
+    assert stats.count == 1
+    assert stats.duration < 1
+
+
+def test_replica_router_round_robin_skips_unhealthy(tmp_path):
+    first = create_engine(f'sqlite:///{tmp_path / "first.db"}')
+    second = create_engine(f'sqlite:///{tmp_path / "second.db"}')
+    router = ReplicaRouter([first, second])
+
+    assert [router.choose() for _ in range(4)] == [first, second, first, second]
+
+    router.mark_down(second)
+    assert [router.choose() for _ in range(3)] == [first, first, first]
+
+    router.mark_down(first)
+    assert router.choose() is None
+    # Todas fora do ar: a leitura vai para o primário.
+
+
+def test_replica_router_read_your_writes(tmp_path):
+    router = ReplicaRouter([create_engine(f'sqlite:///{tmp_path / "replica.db"}')])
+
+    router.mark_write('teste@test.com')
+
+    assert router.choose('teste@test.com') is None
+    assert router.choose('other@test.com') is not None
+
+
+def test_replica_router_health_check(tmp_path):
+    healthy = create_engine(f'sqlite:///{tmp_path / "replica.db"}')
+    broken = create_engine(f'sqlite:///{tmp_path / "missing" / "replica.db"}')
+    router = ReplicaRouter([healthy, broken])
+    router.mark_down(healthy)
+
+    asyncio.run(router.check_health())
+
+    assert [router.choose() for _ in range(2)] == [healthy, healthy]
+
+
+def test_replica_router_marks_replica_down_on_connection_error(tmp_path):
+    broken = create_engine(f'sqlite:///{tmp_path / "missing" / "replica.db"}')
+    router = ReplicaRouter([broken])
+
+    try:
+        with broken.connect():
+            pass
+    except Exception:  # noqa: BLE001
+        pass
+
+    assert router.choose() is None
+
+
+def test_read_endpoints_use_replica(client, token, replica):
+    response = client.get('/users/', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert [user['username'] for user in response.json()['users']] == ['Teste', 'replica-only']
+
+
+def test_reads_after_own_write_use_primary(client, user, token, replica):
+    client.patch(f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'}, json={'username': 'patched'})
+
+    response = client.get('/users/', headers={'Authorization': f'Bearer {token}'})
+
+    assert [user['username'] for user in response.json()['users']] == ['patched']
+
+
+def test_engine_options_per_dialect():
+    settings = get_settings().model_copy(update={'DB_POOL_SIZE': 3, 'DB_STATEMENT_CACHE_SIZE': 0})
+
+    options = engine_options('sqlite+aiosqlite:///app.db', settings)
+    assert options['poolclass'] is TimedAsyncQueuePool
+    assert options['pool_size'] == 3  # noqa: PLR2004
+    assert options['query_cache_size'] == 0
+    assert options['connect_args'] == {'cached_statements': 0}
+
+    assert 'pool_size' not in engine_options('sqlite://', settings)
+    # Banco em memória: uma conexão só, sem pool dimensionado.
+    assert engine_options('postgresql+asyncpg://app@db/app', settings)['connect_args'] == {'prepared_statement_cache_size': 0}
+    assert engine_options('postgresql+psycopg://app@db/app', settings)['connect_args'] == {'prepare_threshold': None}
+
+
+@pytest.mark.parametrize('driver', ['sqlite', 'sqlite+aiosqlite'])
+def test_build_engine_applies_sqlite_pragmas(tmp_path, driver):
+    settings = get_settings().model_copy(update={'SQLITE_BUSY_TIMEOUT_MS': 1234, 'SQLITE_CACHE_SIZE_KIB': 4096})
+    engine = build_engine(f'{driver}:///{tmp_path / "app.db"}', settings)
+
+    async def pragmas():
+        async with engine.connect() as connection:
+            return [
+                (await connection.execute(text(f'PRAGMA {name}'))).scalar() for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size')
+            ]
+
+    def sync_pragmas():
+        with engine.connect() as connection:
+            return [connection.execute(text(f'PRAGMA {name}')).scalar() for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size')]
+
+    async def run():
+        try:
+            return await pragmas() if is_async_url(str(engine.url)) else sync_pragmas()
+        finally:
+            await dispose_engine(engine)
+
+    assert asyncio.run(run()) == ['wal', 1, 1234, -4096]
+    # synchronous: 1 => NORMAL.
+
+
+def test_pool_status_and_wait_metric(tmp_path):
+    settings = get_settings().model_copy(update={'DB_POOL_SIZE': 1, 'DB_MAX_OVERFLOW': 1, 'DB_POOL_TIMEOUT_SECONDS': 0.05})
+    engine = build_engine(f'sqlite:///{tmp_path / "app.db"}', settings, name='pool-test')
+
+    first, second = engine.connect(), engine.connect()
+    assert pool_status(engine) == {'size': 1, 'checked_out': 2, 'overflow': 1}
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    first.close()
+    second.close()
+    engine.dispose()
+
+    counts, total = DB_POOL_WAIT._values[('pool-test',)]
+    assert sum(counts) == 3  # noqa: PLR2004
+    assert total >= 0.05  # noqa: PLR2004
+    # O checkout que estourou o timeout também entra no histograma.
+    assert engine.pool.database == 'pool-test'
+    # O pool recriado pelo dispose mantém o nome.
+    assert pool_status(create_engine('sqlite://')) is None
@@ -0,0 +1,147 @@
+import asyncio
+from http import HTTPStatus
+
+import pytest
+
+from fast_zero.loadshedding import AdaptiveLimiter, ConcurrencyLimitMiddleware, build_limiters, route_class
+from fast_zero.settings import get_settings
+
+
+def _limiter(**kwargs):
+    params = {'initial_limit': 2, 'min_limit': 1, 'max_limit': 4, 'target_latency': 0.1, 'queue_timeout': 0.05}
+    return AdaptiveLimiter('test', **{**params, **kwargs})
+
+
+def test_limiter_increases_on_fast_and_decreases_on_slow_responses():
+    limiter = _limiter()
+
+    async def run():
+        await limiter.acquire()
+        limiter.release(0.01, failed=False)
+        fast_limit = limiter.limit
+        await limiter.acquire()
+        limiter.release(1.0, failed=False)
+        return fast_limit
+
+    assert asyncio.run(run()) == 2.5  # noqa: PLR2004
+    assert limiter.limit == 2.5 * 0.9  # noqa: PLR2004
+
+
+def test_limiter_hands_slot_to_waiter():
+    limiter = _limiter(initial_limit=1, queue_timeout=1)
+
+    async def run():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release(0.01, failed=False)
+        return await waiter
+
+    assert asyncio.run(run()) is True
+    assert limiter.in_flight == 1
+
+
+def test_limiter_rejects_when_queue_is_full():
+    limiter = _limiter(initial_limit=1, max_queue=1, queue_timeout=1)
+
+    async def run():
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        rejected = await limiter.acquire()
+        limiter.release(0.01, failed=False)
+        return rejected, await queued
+
+    assert asyncio.run(run()) == (False, True)
+
+
+def test_limiter_admits_after_slow_burst():
+    # Uma rajada de respostas lentas derruba o limite e deixa a média de latência alta; sem tráfego admitido
+    # ela não baixa. A fila tem que usar a espera real: a vaga liberada logo depois é entregue, sem 503.
+    limiter = _limiter(initial_limit=1, target_latency=0.25, queue_timeout=1)
+
+    async def run():
+        for _ in range(10):
+            await limiter.acquire()
+            limiter.release(5.0, failed=False)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.05)
+        limiter.release(0.01, failed=False)
+        return await waiter
+
+    assert asyncio.run(run()) is True
+    assert limiter.estimated_wait() > limiter.queue_timeout
+
+
+def test_limiter_times_out_in_queue():
+    limiter = _limiter(initial_limit=1, target_latency=0.001, queue_timeout=0.01)
+
+    async def run():
+        await limiter.acquire()
+        return await limiter.acquire()
+
+    assert asyncio.run(run()) is False
+    assert limiter.in_flight == 1
+
+
+def test_route_class():
+    assert route_class({'path': '/auth/token', 'method': 'POST'}) == 'auth'
+    assert route_class({'path': '/users/', 'method': 'GET'}) == 'read'
+    assert route_class({'path': '/users/export', 'method': 'GET'}) == 'export'
+    assert route_class({'path': '/users/export/', 'method': 'GET'}) == 'export'
+    assert route_class({'path': '/users/1', 'method': 'DELETE'}) == 'write'
+    assert route_class({'path': '/users/1', 'method': 'PATCH'}) == 'hash'
+    assert route_class({'path': '/users/', 'method': 'POST'}) == 'hash'
+    assert route_class({'path': '/users', 'method': 'POST'}) == 'hash'
+    assert route_class({'path': '/users/bulk/', 'method': 'POST'}) == 'hash'
+    assert route_class({'path': '/users/1', 'method': 'PUT'}) == 'hash'
+
+
+def test_build_limiters_requires_every_route_class():
+    settings = get_settings().model_copy(update={'CONCURRENCY_TARGET_LATENCY_MS': {'auth': 500, 'write': 250, 'read': 100}})
+
+    with pytest.raises(ValueError, match='export, hash'):
+        build_limiters(settings)
+
+
+def test_export_has_its_own_capped_limit():
+    limiters = build_limiters(get_settings().model_copy(update={'CONCURRENCY_EXPORT_MAX_LIMIT': 2}))
+
+    assert limiters['export'].max_limit == limiters['export'].limit == 2  # noqa: PLR2004
+    assert limiters['read'].max_limit == get_settings().CONCURRENCY_MAX_LIMIT
+
+
+def test_streaming_latency_is_measured_to_first_byte():
+    limiter = _limiter(target_latency=0.05)
+
+    async def streaming_app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await asyncio.sleep(0.2)
+        # Download longo depois do primeiro byte: não pode derrubar o limite.
+        await send({'type': 'http.response.body', 'body': b'rows', 'more_body': False})
+
+    async def send(message):
+        pass
+
+    middleware = ConcurrencyLimitMiddleware(streaming_app, {'export': limiter})
+    asyncio.run(middleware({'type': 'http', 'path': '/users/export', 'method': 'GET'}, None, send))
+
+    assert limiter.limit > 2  # noqa: PLR2004
+    assert limiter.in_flight == 0
+
+
+def test_busy_route_class_returns_503(client, monkeypatch):
+    middleware = next(m for m in client.app.user_middleware if m.cls is ConcurrencyLimitMiddleware)
+    read_limiter = middleware.kwargs['limiters']['read']
+    monkeypatch.setattr(read_limiter, 'in_flight', int(read_limiter.limit))
+    monkeypatch.setattr(read_limiter, 'avg_latency', 60)
+    monkeypatch.setattr(read_limiter, 'queue_timeout', 0.01)
+    # Todas as vagas de leitura ocupadas por requisições lentas: a requisição espera na fila até o deadline.
+
+    response = client.get('/')
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert int(response.headers['Retry-After']) >= 1
+    assert client.post('/users/', json={'username': 'a', 'email': 'a@a.com', 'password': 'x'}).status_code == HTTPStatus.CREATED
+    # As escritas têm o próprio limite e continuam funcionando.
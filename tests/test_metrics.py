@@ -0,0 +1,59 @@
+from http import HTTPStatus
+
+from fastapi.testclient import TestClient
+
+from fast_zero.app import create_app
+from fast_zero.database import ReplicaRouter, build_engine
+from fast_zero.metrics import Counter, Histogram
+from fast_zero.settings import get_settings
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('test_seconds', 'Test.', ['route'], buckets=(0.1, 1.0))
+    histogram.observe(0.05, route='/')
+    histogram.observe(0.5, route='/')
+    histogram.observe(5, route='/')
+
+    assert histogram.render().splitlines() == [
+        '# HELP test_seconds Test.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{route="/",le="0.1"} 1',
+        'test_seconds_bucket{route="/",le="1.0"} 2',
+        'test_seconds_bucket{route="/",le="+Inf"} 3',
+        'test_seconds_sum{route="/"} 5.55',
+        'test_seconds_count{route="/"} 3',
+    ]
+
+
+def test_counter_with_function():
+    counter = Counter('test_total', 'Test.', function=lambda: 7)
+
+    assert counter.render().splitlines()[-1] == 'test_total 7'
+
+
+def test_metrics_endpoint_uses_route_template(client, user, token):
+    client.get('/users/', headers={'Authorization': f'Bearer {token}'})
+    client.delete(f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'})
+
+    response = client.get('/metrics')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'fast_zero_http_requests_total{method="GET",route="/users/",status="200"}' in response.text
+    assert 'fast_zero_http_request_duration_seconds_bucket{method="DELETE",route="/users/{user_id}",status="200",le="+Inf"}' in response.text
+    assert 'fast_zero_db_query_duration_seconds_count' in response.text
+
+
+def test_metrics_endpoint_reports_pool_state(tmp_path, hasher):
+    settings = get_settings().model_copy(update={'DB_POOL_SIZE': 2})
+    engine = build_engine(f'sqlite:///{tmp_path / "pool.db"}', settings)
+    app = create_app(settings, engine=engine, replicas=ReplicaRouter([]), shard_engines=[], hasher=hasher)
+
+    with TestClient(app) as client, engine.connect():
+        response = client.get('/metrics')
+    engine.dispose()
+
+    assert 'fast_zero_db_pool_size{database="primary"} 2' in response.text
+    assert 'fast_zero_db_pool_checked_out{database="primary"} 1' in response.text
+    assert 'fast_zero_db_pool_overflow{database="primary"} 0' in response.text
+    assert 'fast_zero_db_pool_wait_seconds_count{database="primary"}' in response.text
@@ -0,0 +1,73 @@
+import pstats
+from http import HTTPStatus
+from time import sleep
+
+from fastapi.testclient import TestClient
+
+from fast_zero.app import app
+from fast_zero.profiling import ProfilingMiddleware, route_slug, sign_profile_header, verify_profile_header
+
+SECRET = 'profile-secret'
+
+
+def _profiled(tmp_path, **kwargs):
+    return TestClient(ProfilingMiddleware(app, directory=str(tmp_path), **kwargs))
+
+
+def test_profile_header_signature():
+    header = sign_profile_header(SECRET)
+    assert verify_profile_header(SECRET, header)
+    assert not verify_profile_header('other-secret', header)
+    assert not verify_profile_header('', header)
+    assert not verify_profile_header(SECRET, sign_profile_header(SECRET, ttl=-1))
+    assert not verify_profile_header(SECRET, 'garbage')
+
+
+def test_route_slug():
+    assert route_slug('/users/{user_id}') == 'users_user_id'
+    assert route_slug('/auth/token') == 'auth_token'
+    assert route_slug('/') == 'root'
+
+
+def test_sampled_request_writes_collapsed_stacks(tmp_path):
+    client = _profiled(tmp_path, sample_rate=1.0)
+
+    response = client.get('/')
+
+    assert response.status_code == HTTPStatus.OK
+    [profile] = (tmp_path / 'root').iterdir()
+    assert profile.suffix == '.collapsed'
+    assert '-GET-' in profile.name
+    for line in profile.read_text(encoding='utf-8').splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert ';' in stack or ':' in stack
+        assert int(count) > 0
+
+
+def test_signed_header_writes_pstats(tmp_path):
+    client = _profiled(tmp_path, secret=SECRET, mode='cprofile')
+
+    client.get('/')
+    assert not (tmp_path / 'root').exists()
+    # sample_rate 0 e sem header => nada é profilado.
+
+    client.get('/', headers={'X-Profile': 'invalid'})
+    assert not (tmp_path / 'root').exists()
+
+    client.get('/', headers={'X-Profile': sign_profile_header(SECRET)})
+    [profile] = (tmp_path / 'root').iterdir()
+    assert profile.suffix == '.pstats'
+    stats = pstats.Stats(str(profile))
+    assert any(filename.endswith('routing.py') for filename, _, _ in stats.stats)
+    # read_root é um def síncrono e roda no threadpool; o cProfile vê o caminho do FastAPI na thread do event loop.
+
+
+def test_profiles_retention_per_route(tmp_path):
+    client = _profiled(tmp_path, sample_rate=1.0, max_files=2)
+
+    for _ in range(5):
+        client.get('/')
+        sleep(0.002)
+        # Nomes com timestamps diferentes.
+
+    assert len(list((tmp_path / 'root').iterdir())) == 2  # noqa: PLR2004
@@ -1,8 +1,18 @@
+import asyncio
 from http import HTTPStatus
 
+import httpx
+import pytest
 from jwt import decode
+from sqlalchemy import select
 
-from fast_zero.security import create_access_token, settings
+from fast_zero.cache import TTLCache
+from fast_zero.hashing import PasswordHasher, build_password_hash
+from fast_zero.models import User
+from fast_zero.ratelimit import BucketStorage, MemoryBucketStorage, TokenBucketLimiter
+from fast_zero.routers import users
+from fast_zero.security import create_access_token
+from fast_zero.settings import get_settings
 
 
 def test_jwt():
@@ -10,6 +20,7 @@ def test_jwt():
 
     token = create_access_token(data)
 
+    settings = get_settings()
     decoded = decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
     # Decodifica o token JWT usando a chave secreta e o algoritmo especificado.
     assert decoded['test'] == data['test']
@@ -93,3 +104,199 @@ def test_user_delete_forbidden(client, token):
     response = client.delete('/users/111', headers={'Authorization': f'Bearer {token}'})
     assert response.status_code == HTTPStatus.FORBIDDEN
     assert response.json() == {'detail': 'Not enough permission'}
+
+
+def test_hasher_hash_and_verify_in_process_pool():
+    pool = PasswordHasher(workers=1, queue_depth=1)
+
+    async def hash_and_verify():
+        hashed = await pool.hash('secret')
+        return await pool.verify('secret', hashed), await pool.verify('wrong', hashed)
+
+    try:
+        assert asyncio.run(hash_and_verify()) == (True, False)
+    finally:
+        pool.shutdown()
+
+    assert pool.stats.completed == 3  # noqa: PLR2004
+    assert pool.stats.hash_seconds > 0
+    assert pool.pending == 0
+
+
+def test_hashing_queue_full_returns_503(client, hasher, monkeypatch):
+    monkeypatch.setattr(hasher, 'max_pending', 0)
+    # Simula o pool de hashing com a fila cheia.
+    rejected = hasher.stats.rejected
+
+    response = client.post('/users/', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'secret'})
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.headers['Retry-After'] == '1'
+    assert hasher.stats.rejected == rejected + 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    # 'b' foi o menos usado recentemente, então é ele que sai.
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3  # noqa: PLR2004
+
+
+def test_ttl_cache_expires_items():
+    cache = TTLCache(maxsize=2, ttl=-1)
+    cache.set('a', 1)
+
+    assert cache.get('a') is None
+    assert cache.misses == 1
+
+
+def test_get_current_user_uses_principal_cache(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.get('/users/', headers=headers)
+    response = client.get('/users/', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['users'][0]['email'] == user.email
+    principal_cache = client.app.state.principal_cache
+    assert principal_cache.misses == 1
+    assert principal_cache.hits == 1
+
+
+def test_update_user_invalidates_principal_cache(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+
+    response = client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={'username': 'renamed', 'email': 'renamed@test.com', 'password': 'newpassword'},
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    response = client.get('/users/', headers=headers)
+    # O token antigo aponta para o email antigo, que não existe mais.
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_update_user_invalidates_principal_cache_after_commit(client, user, token, monkeypatch):
+    headers = {'Authorization': f'Bearer {token}'}
+    hash_password = users.get_password_hash_async
+    concurrent = []
+
+    async def hash_with_concurrent_read(hasher, password):
+        # Uma requisição com o token antigo chega enquanto o PUT calcula o hash: ela ainda lê a linha antiga
+        # e coloca o usuário de volta no cache de principals, antes do commit.
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=client.app), base_url='http://test') as concurrent_client:
+            concurrent.append((await concurrent_client.get('/users/', headers=headers)).status_code)
+        return await hash_password(hasher, password)
+
+    monkeypatch.setattr(users, 'get_password_hash_async', hash_with_concurrent_read)
+
+    response = client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={'username': 'renamed', 'email': 'renamed@test.com', 'password': 'newpassword'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert concurrent == [HTTPStatus.OK]
+    assert client.get('/users/', headers=headers).status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_update_user_marks_write_before_invalidating_principal_cache(client, user, token, monkeypatch):
+    cache, replicas = client.app.state.principal_cache, client.app.state.replicas
+    pop = cache.pop
+    routed_to_primary = []
+
+    def recording_pop(key):
+        # A partir do pop de depois do commit, quem autenticar com o email antigo precisa ler do primário.
+        routed_to_primary.append(bool(replicas.recent_writes.get(key)))
+        return pop(key)
+
+    monkeypatch.setattr(cache, 'pop', recording_pop)
+
+    response = client.put(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'username': 'renamed', 'email': 'renamed@test.com', 'password': 'newpassword'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert routed_to_primary[-1] is True
+
+
+def test_delete_user_invalidates_principal_cache(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+
+    client.delete(f'/users/{user.id}', headers=headers)
+    response = client.get('/users/', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_get_current_user_query_budget(client, user, token, query_budget):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    query_budget(client.delete('/users/999', headers=headers), 1)
+    # Sem cache: só o SELECT do usuário
+    query_budget(client.delete('/users/999', headers=headers), 0)
+    # Com o usuário no cache de principals nenhuma query é feita
+
+
+def test_login_rehashes_password_with_old_parameters(client, session):
+    old_hash = build_password_hash(time_cost=1, memory_cost=1024, parallelism=1).hash('secret')
+    session.add(User(username='legacy', email='legacy@test.com', password=old_hash))
+    session.commit()
+
+    response = client.post('/auth/token', data={'username': 'legacy@test.com', 'password': 'secret'})
+    assert response.status_code == HTTPStatus.OK
+
+    new_hash = session.scalar(select(User.password).where(User.email == 'legacy@test.com'))
+    assert new_hash != old_hash
+    settings = client.app.state.settings
+    assert f'm={settings.ARGON2_MEMORY_COST},t={settings.ARGON2_TIME_COST},p={settings.ARGON2_PARALLELISM}' in new_hash
+
+    response = client.post('/auth/token', data={'username': 'legacy@test.com', 'password': 'secret'})
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_token_bucket_limiter_rejects_after_capacity():
+    limiter = TokenBucketLimiter('test', capacity=2, per_minute=60, storage=MemoryBucketStorage())
+
+    assert limiter.hit('key') == 0
+    assert limiter.hit('key') == 0
+    assert 0 < limiter.hit('key') <= 1
+    assert limiter.hit('other') == 0
+    assert limiter.rejected == 1
+
+
+def test_incomplete_bucket_storage_fails_on_construction():
+    class ConsumeOnlyStorage(BucketStorage):
+        def consume(self, key, capacity, refill_per_second):  # noqa: PLR6301
+            return 0.0
+
+    with pytest.raises(TypeError, match='clear'):
+        ConsumeOnlyStorage()
+
+
+def test_login_rate_limit_per_account(client, query_budget):
+    _, login_account_limiter = client.app.state.login_limiters
+    for _ in range(client.app.state.settings.LOGIN_RATE_ACCOUNT_CAPACITY):
+        client.post('/auth/token', data={'username': 'victim@test.com', 'password': 'guess'})
+    rejected = login_account_limiter.rejected
+
+    response = client.post('/auth/token', data={'username': 'VICTIM@test.com', 'password': 'guess'})
+
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(response.headers['Retry-After']) >= 1
+    assert login_account_limiter.rejected == rejected + 1
+    query_budget(response, 0)
+    # Recusado antes de qualquer consulta ao banco.
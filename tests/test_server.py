@@ -0,0 +1,75 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool, StaticPool
+
+from fast_zero import server
+from fast_zero.app import create_app
+from fast_zero.database import ReplicaRouter
+from fast_zero.settings import Settings, get_settings
+
+MIB = 1024 * 1024
+
+
+def test_plan_workers_is_limited_by_cpu_and_memory():
+    settings = Settings(HASHING_WORKERS=2, ARGON2_MEMORY_COST=65536, SERVER_MEMORY_FRACTION=1)
+
+    plan = server.plan_workers(settings, cpus=8, memory=64 * 1024 * MIB)
+    assert plan.worker_memory_mib == 100 + 2 * (40 + 64)  # noqa: PLR2004
+    assert plan.workers == plan.by_cpu == 8  # noqa: PLR2004
+
+    plan = server.plan_workers(settings, cpus=8, memory=1024 * MIB)
+    assert plan.by_memory == 1024 // 308
+    assert plan.workers == 3  # noqa: PLR2004
+
+
+def test_plan_workers_never_below_one_and_respects_override():
+    settings = Settings(SERVER_MEMORY_FRACTION=1)
+    assert server.plan_workers(settings, cpus=4, memory=10 * MIB).workers == 1
+    assert server.plan_workers(Settings(SERVER_WORKERS=6), cpus=2, memory=MIB).workers == 6  # noqa: PLR2004
+
+
+def test_pool_capacity(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "pool.db"}', pool_size=3, max_overflow=4)
+    assert server.pool_capacity(engine, max_overflow=4) == (3, 7)
+    assert server.pool_capacity(create_engine('sqlite://', poolclass=NullPool)) is None
+    assert server.pool_capacity(create_engine('sqlite://')) is None
+    # Banco em memória: SingletonThreadPool, que também tem um atributo size mas não é um QueuePool.
+    assert server.pool_capacity(create_engine('sqlite://', poolclass=StaticPool)) is None
+
+
+def test_warmup_fills_pool_and_starts_hasher(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "warmup.db"}', pool_size=3)
+    settings = get_settings().model_copy(update={'WARMUP_ON_STARTUP': True, 'HASHING_WORKERS': 1})
+    app = create_app(settings, engine=engine, replicas=ReplicaRouter([]), shard_engines=[])
+
+    with TestClient(app):
+        assert engine.pool.checkedin() == 3  # noqa: PLR2004
+        hasher = app.state.hasher
+        assert len(hasher.executor._processes) == hasher.workers
+    # O hasher criado pelo app é encerrado no shutdown; o engine injetado continua aberto.
+    assert hasher._executor is None
+    engine.dispose()
+
+    assert server.COLD_START._values.keys() >= {('pool',), ('hasher',), ('app',), ('total',)}
+
+
+def test_main_single_worker_enables_warmup(monkeypatch):
+    monkeypatch.setenv('WARMUP_ON_STARTUP', 'false')
+    monkeypatch.setenv(server.LAUNCH_TIME_ENV, '0')
+    monkeypatch.setattr('sys.argv', ['fast_zero.server', '--workers', '1'])
+    started = {}
+
+    def fake_run(target, **kwargs):
+        # Com um worker o uvicorn chama a factory no próprio processo.
+        started['warmup'] = get_settings().WARMUP_ON_STARTUP
+        started['workers'] = kwargs['workers']
+
+    monkeypatch.setattr(server.uvicorn, 'run', fake_run)
+    get_settings.cache_clear()
+    try:
+        server.main()
+    finally:
+        get_settings.cache_clear()
+        # O próximo get_settings volta a ler o ambiente restaurado pelo monkeypatch.
+
+    assert started == {'warmup': True, 'workers': 1}
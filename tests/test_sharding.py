@@ -0,0 +1,201 @@
+import json
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from fast_zero.models import LoginEvent, User, UserKey
+from fast_zero.routers import users
+from fast_zero.sharding import SHARD_ID_STRIDE, key_shard
+
+
+def _email_for_shard(index, prefix):
+    # Procura um email cujo hash caia no shard pedido (3 shards nos testes).
+    return next(f'{prefix}{n}@test.com' for n in range(1000) if key_shard(f'{prefix}{n}@test.com', 3) == index)
+
+
+def _create(client, username, email, password='secret'):
+    return client.post('/users/', json={'username': username, 'email': email, 'password': password})
+
+
+def _token(client, email, password='secret'):
+    return client.post('/auth/token', data={'username': email, 'password': password}).json()['access_token']
+
+
+def _shard_rows(tmp_path, index, model):
+    engine = create_engine(f'sqlite:///{tmp_path / f"shard{index}.db"}')
+    with engine.connect() as connection:
+        rows = connection.execute(select(model)).all()
+    engine.dispose()
+    return rows
+
+
+def test_key_shard_is_stable():
+    assert key_shard('teste@test.com', 3) == key_shard('teste@test.com', 3)
+    assert {key_shard(f'user{n}@test.com', 3) for n in range(50)} == {0, 1, 2}
+
+
+@pytest.mark.parametrize('index', [0, 1, 2])
+def test_create_user_goes_to_email_shard(client, shard_engines, index):
+    response = _create(client, f'user{index}', _email_for_shard(index, 'user'))
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['id'] % SHARD_ID_STRIDE == index
+
+
+def test_first_id_of_each_shard_is_positive(client, shard_engines):
+    ids = [_create(client, f'first{index}', _email_for_shard(index, 'first')).json()['id'] for index in (0, 1, 2)]
+    # Primeiro usuário de cada shard, inclusive o do shard 0: id 0 quebraria checagens como `if user_id`.
+
+    assert ids == [SHARD_ID_STRIDE, SHARD_ID_STRIDE + 1, SHARD_ID_STRIDE + 2]
+
+
+def test_users_are_stored_in_their_shard(client, shard_engines, tmp_path):
+    email = _email_for_shard(1, 'stored')
+    _create(client, 'stored', email)
+
+    assert [row.email for row in _shard_rows(tmp_path, 1, User)] == [email]
+    assert _shard_rows(tmp_path, 2, User) == []
+
+
+def test_username_is_unique_across_shards(client, shard_engines):
+    _create(client, 'dup', _email_for_shard(1, 'first'))
+
+    response = _create(client, 'dup', _email_for_shard(2, 'second'))
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {'detail': 'Username or email already exists'}
+
+
+def test_read_users_merges_shards(client, shard_engines):
+    ids = [_create(client, f'user{n}', _email_for_shard(n % 3, f'merge{n}')).json()['id'] for n in range(6)]
+    token = _token(client, _email_for_shard(0, 'merge0'))
+
+    first = client.get('/users/?limit=4', headers={'Authorization': f'Bearer {token}'}).json()
+    second = client.get(f'/users/?limit=4&cursor={first["next_cursor"]}', headers={'Authorization': f'Bearer {token}'}).json()
+    offset = client.get('/users/?limit=2&offset=3', headers={'Authorization': f'Bearer {token}'}).json()
+
+    assert [user['id'] for user in first['users'] + second['users']] == sorted(ids)
+    assert second['next_cursor'] is None
+    assert [user['id'] for user in offset['users']] == sorted(ids)[3:5]
+
+
+def test_export_merges_shards(client, shard_engines):
+    ids = [_create(client, f'user{n}', _email_for_shard(n % 3, f'export{n}')).json()['id'] for n in range(6)]
+    token = _token(client, _email_for_shard(1, 'export1'))
+
+    response = client.get('/users/export', headers={'Authorization': f'Bearer {token}'})
+
+    assert [json.loads(line)['id'] for line in response.text.splitlines()] == sorted(ids)
+
+
+def test_patch_email_keeps_user_in_home_shard(client, shard_engines):
+    email = _email_for_shard(1, 'moving')
+    user_id = _create(client, 'moving', email).json()['id']
+    new_email = _email_for_shard(2, 'moved')
+
+    response = client.patch(f'/users/{user_id}', headers={'Authorization': f'Bearer {_token(client, email)}'}, json={'email': new_email})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'id': user_id, 'username': 'moving', 'email': new_email}
+    # Login com o email novo encontra o usuário no shard original.
+    assert client.get('/users/', headers={'Authorization': f'Bearer {_token(client, new_email)}'}).status_code == HTTPStatus.OK
+    # O email antigo fica livre para outro cadastro.
+    assert _create(client, 'other', email).status_code == HTTPStatus.CREATED
+
+
+def test_delete_user_releases_keys(client, shard_engines, tmp_path):
+    email = _email_for_shard(2, 'deleted')
+    user_id = _create(client, 'deleted', email).json()['id']
+
+    response = client.delete(f'/users/{user_id}', headers={'Authorization': f'Bearer {_token(client, email)}'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert _shard_rows(tmp_path, 2, User) == []
+    assert _create(client, 'deleted', email).status_code == HTTPStatus.CREATED
+
+
+def test_bulk_create_across_shards(client, shard_engines, tmp_path):
+    owner = _email_for_shard(0, 'owner')
+    _create(client, 'owner', owner)
+    users = [{'username': f'bulk{n}', 'email': _email_for_shard(n % 3, f'bulk{n}'), 'password': 'secret'} for n in range(6)]
+    users.append({'username': 'owner', 'email': 'another@test.com', 'password': 'secret'})
+
+    response = client.post('/users/bulk', headers={'Authorization': f'Bearer {_token(client, owner)}'}, json={'users': users})
+
+    results = response.json()['results']
+    assert [result['status'] for result in results] == ['created'] * 6 + ['conflict']
+    assert all(result['user']['id'] % SHARD_ID_STRIDE == key_shard(result['user']['email'], 3) for result in results[:6])
+    assert len(_shard_rows(tmp_path, 1, User)) == 2  # noqa: PLR2004
+    assert 'email:another@test.com' not in {row.key for index in (1, 2) for row in _shard_rows(tmp_path, index, UserKey)}
+    # O usuário em conflito não deixa reserva para trás.
+
+
+def test_login_audit_goes_to_user_shard(client, shard_engines, tmp_path):
+    email = _email_for_shard(2, 'audit')
+    user_id = _create(client, 'audit', email).json()['id']
+    _token(client, email)
+
+    client.portal.call(client.app.state.login_audit.flush)
+
+    [event] = _shard_rows(tmp_path, 2, LoginEvent)
+    assert event.user_id == user_id
+    [row] = _shard_rows(tmp_path, 2, User)
+    assert row.last_login_at == event.logged_in_at
+
+
+def test_create_user_retries_shard_id_collision(client, shard_engines, monkeypatch):
+    taken = _create(client, 'taken', _email_for_shard(1, 'taken')).json()['id']
+    real_next_id = users.next_id
+    calls = []
+
+    def colliding_next_id(index):
+        # Simula outro cadastro no mesmo shard que calculou o mesmo id ao mesmo tempo.
+        calls.append(index)
+        return taken if len(calls) == 1 else real_next_id(index)
+
+    monkeypatch.setattr(users, 'next_id', colliding_next_id)
+    response = _create(client, 'retried', _email_for_shard(1, 'retried'))
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['id'] not in {taken, None}
+    assert response.json()['id'] % SHARD_ID_STRIDE == 1
+    assert calls == [1, 1]
+
+
+def test_update_user_conflict_rolls_back_before_releasing_keys(client, shard_engines, tmp_path):
+    email = _email_for_shard(1, 'owner')
+    user_id = _create(client, 'owner', email).json()['id']
+    username = next(f'legacy{n}' for n in range(1000) if key_shard(f'username:legacy{n}', 3) == 1)
+    engine = create_engine(f'sqlite:///{tmp_path / "shard1.db"}')
+    with engine.begin() as connection:
+        connection.execute(insert(User).values(id=user_id + SHARD_ID_STRIDE, username=username, email='legacy@test.com', password='secret'))
+    engine.dispose()
+    # Linha sem reserva em user_keys: o claim passa e o conflito só aparece no commit, no mesmo shard da reserva nova.
+
+    response = client.put(
+        f'/users/{user_id}',
+        headers={'Authorization': f'Bearer {_token(client, email)}'},
+        json={'username': username, 'email': email, 'password': 'secret'},
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert f'username:{username}' not in {row.key for row in _shard_rows(tmp_path, 1, UserKey)}
+
+
+def test_update_user_hashing_busy_does_not_claim_keys(client, shard_engines, hasher, monkeypatch):
+    email = _email_for_shard(1, 'busy')
+    user_id = _create(client, 'busy', email).json()['id']
+    token = _token(client, email)
+    monkeypatch.setattr(hasher, 'max_pending', 0)
+    # Fila de hashing cheia: o PUT responde 503.
+
+    response = client.put(
+        f'/users/{user_id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'username': 'wanted', 'email': 'wanted@test.com', 'password': 'secret'},
+    )
+    monkeypatch.undo()
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert _create(client, 'wanted', 'wanted@test.com').status_code == HTTPStatus.CREATED
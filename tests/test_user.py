@@ -1,6 +1,13 @@
+import json
 from http import HTTPStatus
 
+import pytest
+from sqlalchemy import text
+
+from fast_zero.models import User
+from fast_zero.routers import users as users_router
 from fast_zero.schemas import UserPublic
+from fast_zero.security import get_password_hash
 
 
 def test_create_user_deve_retornar_created_user_200(client):
@@ -34,6 +41,60 @@ def test_create_user_deve_retornar_created_user_409(client, user):
     assert response.json() == {'detail': 'Username or email already exists'}
 
 
+def test_create_users_bulk(client, user, token):
+    response = client.post(
+        '/users/bulk',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'users': [
+                {'username': 'alice', 'email': 'alice@test.com', 'password': 'secret'},
+                {'username': 'Teste', 'email': 'other@test.com', 'password': 'secret'},
+                {'username': 'bob', 'email': 'bob@test.com', 'password': 'secret'},
+                {'username': 'alice', 'email': 'alice2@test.com', 'password': 'secret'},
+            ]
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'results': [
+            {'index': 0, 'status': 'created', 'user': {'id': 2, 'username': 'alice', 'email': 'alice@test.com'}},
+            {'index': 1, 'status': 'conflict', 'user': None},
+            {'index': 2, 'status': 'created', 'user': {'id': 3, 'username': 'bob', 'email': 'bob@test.com'}},
+            {'index': 3, 'status': 'conflict', 'user': None},
+        ]
+    }
+
+    response = client.post('/auth/token', data={'username': 'bob@test.com', 'password': 'secret'})
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_create_users_bulk_retries_after_race(client, user, token, monkeypatch):
+    real_bulk_conflicts = users_router._bulk_conflicts
+    calls = []
+
+    async def stale_bulk_conflicts(session, users):
+        # Na primeira chamada finge que ninguém existe, como se 'Teste' tivesse sido criado depois da verificação.
+        calls.append(users)
+        return set() if len(calls) == 1 else await real_bulk_conflicts(session, users)
+
+    monkeypatch.setattr(users_router, '_bulk_conflicts', stale_bulk_conflicts)
+
+    response = client.post(
+        '/users/bulk',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'users': [
+                {'username': 'Teste', 'email': 'other@test.com', 'password': 'secret'},
+                {'username': 'bob', 'email': 'bob@test.com', 'password': 'secret'},
+            ]
+        },
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [item['status'] for item in response.json()['results']] == ['conflict', 'created']
+
+
 def test_read_users_deve_retornar_usuarios(client, user, token):
     # Primeiro, criar alguns usuários para garantir que a lista não esteja vazia
     user_schema = UserPublic.model_validate(user).model_dump()
@@ -44,7 +105,50 @@ def test_read_users_deve_retornar_usuarios(client, user, token):
     # Adiciona o cabeçalho de autorização com um token fictício para simular um usuário autenticado.
     # Sem esse cabeçalho, o endpoint retornaria um erro 401 Unauthorized.
     assert response.status_code == HTTPStatus.OK
-    assert response.json() == {'users': [user_schema]}
+    assert response.json() == {'users': [user_schema], 'next_cursor': None}
+
+
+def test_read_users_keyset_pagination(client, session, user, token):
+    session.add_all([User(username=f'user{i}', email=f'user{i}@test.com', password='secret') for i in range(4)])
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.get('/users/?limit=2', headers=headers).json()
+    second = client.get(f'/users/?limit=2&cursor={first["next_cursor"]}', headers=headers).json()
+    last = client.get(f'/users/?limit=2&cursor={second["next_cursor"]}', headers=headers).json()
+
+    assert [u['username'] for u in first['users']] == ['Teste', 'user0']
+    assert [u['username'] for u in second['users']] == ['user1', 'user2']
+    assert [u['username'] for u in last['users']] == ['user3']
+    assert last['next_cursor'] is None
+
+
+def test_read_users_invalid_cursor(client, token):
+    response = client.get('/users/?cursor=not-a-cursor', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_export_users_ndjson(client, session, user, token):
+    session.add(User(username='bob', email='bob@test.com', password='secret'))
+    session.commit()
+
+    response = client.get('/users/export', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {'id': 1, 'username': 'Teste', 'email': 'teste@test.com'},
+        {'id': 2, 'username': 'bob', 'email': 'bob@test.com'},
+    ]
+
+
+def test_export_users_csv(client, user, token):
+    response = client.get('/users/export?format=csv', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/csv')
+    assert response.text.splitlines() == ['id,username,email', '1,Teste,teste@test.com']
 
 
 def test_upadate_user(client, user, token):
@@ -98,3 +202,240 @@ def test_delete_user(client, user, token):
     )
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {'message': 'User deleted successfully'}
+
+
+def test_create_user_query_budget(client, query_budget):
+    response = client.post('/users/', json={'username': 'alice', 'email': 'alice@exemplo.com', 'password': 'senha123'})
+
+    assert response.status_code == HTTPStatus.CREATED
+    query_budget(response, 3)
+    # SELECT de duplicados + INSERT + SELECT do refresh
+
+
+def test_update_user_query_budget(client, user, token, query_budget):
+    response = client.put(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'username': 'alice', 'email': 'alice@exemplo.com', 'password': 'senha123'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    query_budget(response, 3)
+    # SELECT do get_current_user + UPDATE + SELECT do refresh
+
+
+def test_patch_user(client, user, token, query_budget):
+    response = client.patch(f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'}, json={'username': 'renamed'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'id': user.id, 'username': 'renamed', 'email': 'teste@test.com'}
+    query_budget(response, 2)
+    # SELECT do get_current_user + UPDATE ... RETURNING
+
+    response = client.post('/auth/token', data={'username': user.email, 'password': user.clean_password})
+    assert response.status_code == HTTPStatus.OK
+    # A senha não foi enviada, então o hash continua o mesmo.
+
+
+def test_patch_user_password(client, user, token):
+    response = client.patch(f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'}, json={'password': 'new-secret'})
+    assert response.status_code == HTTPStatus.OK
+
+    response = client.post('/auth/token', data={'username': user.email, 'password': 'new-secret'})
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_patch_user_without_changes(client, user, token):
+    response = client.patch(f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'}, json={})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'id': user.id, 'username': 'Teste', 'email': 'teste@test.com'}
+
+
+def test_patch_user_conflict(client, session, user, token):
+    session.add(User(username='bob', email='bob@test.com', password='secret'))
+    session.commit()
+
+    response = client.patch(f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'}, json={'email': 'bob@test.com'})
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {'detail': 'Username or email already exists'}
+
+
+def test_patch_user_forbidden(client, token):
+    response = client.patch('/users/999', headers={'Authorization': f'Bearer {token}'}, json={'username': 'x'})
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+
+
+def _add_search_users(session):
+    session.add_all([
+        User(username='Alice', email='alice@test.com', password='secret'),
+        User(username='alicia', email='ALICIA@test.com', password='secret'),
+        User(username='alberto', email='alberto@test.com', password='secret'),
+        User(username='bob', email='bob@test.com', password='secret'),
+    ])
+    session.commit()
+
+
+def test_search_users_by_username_prefix(client, session, user, token):
+    _add_search_users(session)
+
+    response = client.get('/users/search?q=ALI', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert [user['username'] for user in response.json()['users']] == ['Alice', 'alicia']
+    assert response.json()['next_cursor'] is None
+
+
+def test_search_users_by_email_paginates_with_cursor(client, session, user, token):
+    _add_search_users(session)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.get('/users/search?q=al&field=email&limit=2', headers=headers).json()
+    second = client.get(f'/users/search?q=al&field=email&limit=2&cursor={first["next_cursor"]}', headers=headers).json()
+
+    assert [user['email'] for user in first['users']] == ['alberto@test.com', 'alice@test.com']
+    assert [user['email'] for user in second['users']] == ['ALICIA@test.com']
+    assert second['next_cursor'] is None
+
+
+def test_search_users_invalid_cursor(client, token):
+    response = client.get('/users/search?q=al&cursor=not-a-cursor', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_search_query_uses_lower_index(session):
+    for after in (None, ('ali', 1)):
+        query = users_router.user_search_query('email', 'Ali', after).limit(11)
+        sql = str(query.compile(session.bind, compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+        assert any('USING INDEX ix_users_email_lower' in step for step in plan), plan
+        assert not any(step.startswith('SCAN') for step in plan), plan
+
+
+def test_read_user(client, user, token):
+    response = client.get(f'/users/{user.id}', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'id': user.id, 'username': 'Teste', 'email': 'teste@test.com'}
+    assert response.headers['ETag'].startswith('"')
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_read_user_not_found(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/users/999', headers=headers).status_code == HTTPStatus.NOT_FOUND
+    assert client.get('/users/999', headers={**headers, 'If-None-Match': '*'}).status_code == HTTPStatus.NOT_FOUND
+
+
+def test_read_user_not_modified(client, user, token, query_budget):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get(f'/users/{user.id}', headers=headers).headers['ETag']
+
+    response = client.get(f'/users/{user.id}', headers={**headers, 'If-None-Match': f'"other", W/{etag}'})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['ETag'] == etag
+    assert not response.content
+    query_budget(response, 1)
+    # Só a consulta do updated_at (o usuário autenticado vem do cache).
+
+
+def test_read_user_etag_changes_after_update(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get(f'/users/{user.id}', headers=headers).headers['ETag']
+
+    client.patch(f'/users/{user.id}', headers=headers, json={'username': 'renamed'})
+    response = client.get(f'/users/{user.id}', headers={**headers, 'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['username'] == 'renamed'
+    assert response.headers['ETag'] != etag
+
+
+def test_read_users_not_modified(client, user, token, query_budget):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/users/', headers=headers).headers['ETag']
+
+    response = client.get('/users/', headers={**headers, 'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    query_budget(response, 1)
+
+    client.post('/users/', json={'username': 'bob', 'email': 'bob@test.com', 'password': 'secret'})
+    response = client.get('/users/', headers={**headers, 'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()['users']) == 2  # noqa: PLR2004
+    assert response.headers['ETag'] != etag
+
+
+@pytest.fixture
+def no_settle(client, monkeypatch):
+    # Sem a janela de espera as mudanças aparecem no /users/changes assim que são gravadas.
+    monkeypatch.setattr(client.app.state.settings, 'SYNC_SETTLE_SECONDS', 0)
+
+
+def test_read_changes_full_then_incremental(client, user, token, no_settle):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.get('/users/changes', headers=headers).json()
+
+    assert [(change['op'], change['id']) for change in first['changes']] == [('upsert', user.id)]
+    assert first['changes'][0]['user'] == {'id': user.id, 'username': 'Teste', 'email': 'teste@test.com'}
+    assert first['has_more'] is False
+
+    empty = client.get(f'/users/changes?since={first["watermark"]}', headers=headers).json()
+    assert empty == {'changes': [], 'watermark': first['watermark'], 'has_more': False}
+
+    client.patch(f'/users/{user.id}', headers=headers, json={'username': 'renamed'})
+    changed = client.get(f'/users/changes?since={first["watermark"]}', headers=headers).json()
+    assert [change['user']['username'] for change in changed['changes']] == ['renamed']
+
+
+def test_read_changes_reports_deletes(client, session, user, token, no_settle):
+    bob = User(username='bob', email='bob@test.com', password=get_password_hash('secret'))
+    session.add(bob)
+    session.commit()
+    bob_token = client.post('/auth/token', data={'username': 'bob@test.com', 'password': 'secret'}).json()['access_token']
+    watermark = client.get('/users/changes', headers={'Authorization': f'Bearer {token}'}).json()['watermark']
+
+    client.delete(f'/users/{bob.id}', headers={'Authorization': f'Bearer {bob_token}'})
+    response = client.get(f'/users/changes?since={watermark}', headers={'Authorization': f'Bearer {token}'})
+
+    assert [(change['op'], change['id'], change['user']) for change in response.json()['changes']] == [('delete', bob.id, None)]
+
+
+def test_read_changes_paginates(client, session, user, token, no_settle):
+    session.add_all([User(username=f'user{n}', email=f'user{n}@test.com', password='secret') for n in range(4)])
+    session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    seen = []
+    watermark = None
+    for _ in range(3):
+        query = f'?limit=2&since={watermark}' if watermark else '?limit=2'
+        page = client.get(f'/users/changes{query}', headers=headers).json()
+        seen.extend(change['id'] for change in page['changes'])
+        watermark = page['watermark']
+        if not page['has_more']:
+            break
+
+    assert sorted(seen) == list(range(1, 6))
+    assert len(seen) == len(set(seen))
+
+
+def test_read_changes_waits_for_settle_window(client, user, token):
+    response = client.get('/users/changes', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.json() == {'changes': [], 'watermark': None, 'has_more': False}
+
+
+def test_read_changes_invalid_watermark(client, token):
+    response = client.get('/users/changes?since=invalid', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY